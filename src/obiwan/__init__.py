@@ -8,6 +8,7 @@ from obiwan.scc import OwScc
 from pathlib import Path
 
 import argparse
+import atexit
 import datetime
 import os
 import sys
@@ -28,11 +29,15 @@ class ObiwanApplication:
             to retrieve SCC system IDs when converting raw measurements to SCC NetCDF
             input files.
         scc (:obj:`OwScc`): Helper object used to interact with the SCC API or website.
+        start_time (:obj:`datetime.datetime`): Time when the application was started.
     """
     DEFAULT_CONFIGURATION_FILE = "obiwan/obiwan.config.yaml"
     SWAP_FILE_NAME = "obiwan.swp"
+    CACHE_FILE_NAME = "obiwan.cache"
     
     def __init__(self):
+        self.start_time = datetime.datetime.now()
+        
         # Initialize logger
         self.logger = logger
         
@@ -66,21 +71,24 @@ class ObiwanApplication:
         self.datalog.set_file_path ( datalog_path )
         self.datalog.set_csv_path ( self.args.datalog )
         
+        # The datalog only checkpoints changes in batches, so make sure any pending
+        # changes reach the swap file if we crash. Termination is handled by `obiwan.app.main`.
+        atexit.register ( self.datalog.flush )
+        
         # Initialize lidar system collection
         self.system_index = SystemIndex()
         self.system_index.ReadFolder (self.config.scc_configurations_folder)
         
-        # Initialize SCC client
+        # Initialize SCC client. The connection to the SCC is only made when it is first
+        # needed, so runs which never talk to the SCC (e.g. --convert) don't even load it.
         self.scc = OwScc()
         self.scc.Initialize(
             self.config.scc_basic_credentials,
             self.config.scc_output_dir,
             self.config.scc_base_url,
-            self.config.scc_website_credentials
+            self.config.scc_website_credentials,
+            self.config.maximum_concurrent_uploads
         )
-        
-        if not self.args.convert:
-            self.scc.Login()
             
     def parse_args(self) -> argparse.Namespace:
         """
@@ -108,6 +116,10 @@ class ObiwanApplication:
         parser.add_argument("--resume", help="Tries to resume past, interrupted, processing if possible.", action="store_true")
         parser.add_argument("--test-files", help="Copies any raw test files to tests folder.", action="store_true", dest="test_files")
         parser.add_argument("--debug", help="Copies raw measurement files and resulting NetCDF files in the debug folder.", action="store_true")
+        parser.add_argument("--scan-workers", help="Number of raw files to read at the same time when scanning the data folder. Defaults to a value based on the number of CPUs.", type=int, default=None, dest="scan_workers")
+        parser.add_argument("--scan-processes", help="Parse the raw file headers in separate processes when scanning the data folder.", action="store_true", dest="scan_processes")
+        parser.add_argument("--convert-workers", help="Number of measurements to convert at the same time.", type=int, default=1, dest="convert_workers")
+        parser.add_argument("--upload-workers", help="Number of measurements to upload at the same time. Defaults to the scc_maximum_concurrent_uploads configuration value.", type=int, default=None, dest="upload_workers")
         
         args = parser.parse_args ()
         
@@ -121,6 +133,10 @@ class ObiwanApplication:
         else:
             args.enddate = datetime.datetime.strptime( args.enddate, '%Y%m%d%H%M%S' )
             
+        # Resolve the data folder only once, it is used in many places afterwards:
+        if args.folder is not None:
+            args.folder = os.path.abspath ( args.folder )
+            
         return args
         
 obiwan = ObiwanApplication()
\ No newline at end of file
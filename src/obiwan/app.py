@@ -1,19 +1,24 @@
 from obiwan.repository import Lidarchive, MeasurementSet
 
-from obiwan import obiwan
+from obiwan import obiwan, ObiwanApplication
 from obiwan.data import get_reader_for_type
 from obiwan.log import Datalog
 
 from obiwan.config import Config
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as wait_futures
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Union
+from typing import List, Optional, Union
 
 import argparse
 import datetime
+import logging
 import os
+import signal
 import sys
 import shutil
+import tarfile
 import time
 
 import traceback
@@ -43,14 +48,14 @@ def Convert ( config : Config, measurement : MeasurementSet ) -> Union[Path, Non
         obiwan.logger.error ( "Could not find any data files for this measurement.", extra={'scope': measurement.Id()} )
         return None
         
-    obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.SYSTEM_ID, system_id) )
+    obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.SYSTEM_ID, system_id), save = False )
     
     # Find the right handler for this file type and convert to SCC NetCDF input file
     try:
         reader = get_reader_for_type ( measurement.Type() )
         
         # We can also use this opportunity to set a more appropriate process_start information:
-        obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.PROCESS_START, datetime.datetime.now()) )
+        obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.PROCESS_START, datetime.datetime.now()), save = False )
         
         file_path, measurement_id = reader.convert_to_scc (
             measurement_set = measurement,
@@ -67,61 +72,196 @@ def Convert ( config : Config, measurement : MeasurementSet ) -> Union[Path, Non
         # Conversion has failed
         return None
     
-    obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.CONVERTED, True) )
-    obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.SCC_MEASUREMENT_ID, measurement_id) )
-    obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.SCC_NETCDF_PATH, file_path) )
-    obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.RESULT, "Converted to SCC NetCDF") )
+    obiwan.datalog.update_task_many ( measurement.Id(), [
+        (Datalog.Field.CONVERTED, True),
+        (Datalog.Field.SCC_MEASUREMENT_ID, measurement_id),
+        (Datalog.Field.SCC_NETCDF_PATH, file_path),
+        (Datalog.Field.RESULT, "Converted to SCC NetCDF")
+    ] )
     
     return file_path
     
-def DebugMeasurement ( measurement : MeasurementSet, measurements_debug_dir : Path ) -> None:
+def DebugMeasurement ( measurement : MeasurementSet, measurements_debug_dir : Path, mode : str = "copy", copy_workers : int = 1 ) -> None:
     """
     Copy raw data files and, if available, the SCC NetCDF file to the specified folder
     for debugging purposes regarding which files were converted.
     
     Note:
         Each measurement set will be copied inside its own subfolder, inside the specified
-        `measurements_debug_dir`.
+        `measurements_debug_dir`. When using the "tar" mode, each measurement set will be
+        stored as a single tar archive instead.
     
     Args:
         measurement (:obj:`MeasurementSet`): Measurement set to debug.
         measurements_debug_dir (:obj:`Path`): Path to the folder where the files should be copied to.
+        mode (str): How to store the files. One of "copy", "hardlink" or "tar". Defaults to "copy".
+        copy_workers (int): Number of files to copy at the same time. Only used when the debug folder
+            is on a different device than the raw data, as parallel copies on the same disk would only
+            compete with each other. Defaults to 1.
     """
-    if measurements_debug_dir:
-        debug_date_str = measurement.DataFiles()[0].StartDateTime().strftime('%Y-%m-%d-%H-%M')
-        debug_dir = os.path.join ( measurements_debug_dir, debug_date_str )
-
-        if os.path.exists (debug_dir):
-            i = 2
-            temp_debug_dir = "%s_%d" % (debug_dir, i)
-            
-            while os.path.exists ( temp_debug_dir ):
-                i += 1
-                temp_debug_dir = "%s_%d" % (debug_dir, i)
+    if not measurements_debug_dir:
+        return
+        
+    suffix = ".tar" if mode == "tar" else ""
+    
+    debug_date_str = measurement.DataFiles()[0].StartDateTime().strftime('%Y-%m-%d-%H-%M')
+    
+    # List the debug folder once, instead of checking every candidate name on the disk:
+    existing = { entry.name for entry in os.scandir ( measurements_debug_dir ) }
+    
+    debug_name = debug_date_str
+    i = 2
+    
+    while debug_name + suffix in existing:
+        debug_name = "%s_%d" % (debug_date_str, i)
+        i += 1
+        
+    debug_dir = os.path.join ( measurements_debug_dir, debug_name )
+    
+    # The name could still get taken in the meantime, in which case we move on to the next one:
+    while True:
+        try:
+            if mode == "tar":
+                archive = tarfile.open ( debug_dir + suffix, mode = 'x' )
+            else:
+                os.makedirs ( debug_dir )
+                
+            break
+        except FileExistsError:
+            debug_dir = os.path.join ( measurements_debug_dir, "%s_%d" % (debug_date_str, i) )
+            i += 1
+    
+    measurement_path = obiwan.datalog.task_info ( measurement.Id(), Datalog.Field.SCC_NETCDF_PATH )
+    
+    if mode == "tar":
+        # Store everything in a single archive, avoiding the per-file copy overhead:
+        with archive:
+            for file in measurement.DataFiles():
+                archive.add ( file.Path(), arcname = os.path.basename ( file.Path() ) )
+                
+            for file in measurement.DarkFiles():
+                archive.add ( file.Path(), arcname = os.path.join ( "D", os.path.basename ( file.Path() ) ) )
                 
-            debug_dir = temp_debug_dir
+            archive.add ( measurement_path, arcname = os.path.basename ( measurement_path ) )
+            
+        return
         
-        debug_dark_dir = os.path.join ( debug_dir, "D" )
+    debug_dark_dir = os.path.join ( debug_dir, "D" )
 
-    os.makedirs ( debug_dir )
     os.makedirs ( debug_dark_dir )
     
-    # obiwan.logger.debug ("Raw data files:")
-    for file in measurement.DataFiles():
-        # obiwan.logger.debug ( os.path.basename(file.Path()) )
-        if measurements_debug_dir:
-            shutil.copy2 ( file.Path(), debug_dir )
-        
-    # obiwan.logger.debug ("Raw dark files:")
-    for file in measurement.DarkFiles():
-        # obiwan.logger.debug ( os.path.basename(file.Path()) )
-        if measurements_debug_dir:
-            shutil.copy2 ( file.Path(), debug_dark_dir )
+    jobs = [ (file.Path(), debug_dir) for file in measurement.DataFiles() ]
+    jobs += [ (file.Path(), debug_dark_dir) for file in measurement.DarkFiles() ]
+    jobs.append ( (measurement_path, debug_dir) )
+    
+    if copy_workers > 1 and os.stat ( jobs[0][0] ).st_dev == os.stat ( debug_dir ).st_dev:
+        copy_workers = 1
+        
+    if copy_workers <= 1:
+        for source, destination_folder in jobs:
+            CopyDebugFile ( source, destination_folder, mode )
+            
+        return
+        
+    with ThreadPoolExecutor ( max_workers = copy_workers ) as executor:
+        futures = [ executor.submit ( CopyDebugFile, source, destination_folder, mode ) for source, destination_folder in jobs ]
+        
+        # Surface any copy error, just like the serial copy would:
+        for future in futures:
+            future.result()
+    
+def CopyDebugFile ( source : Path, destination_folder : Path, mode : str ) -> None:
+    """
+    Copy a single file inside the debug folder.
+    
+    Args:
+        source (:obj:`Path`): Path of the file to copy.
+        destination_folder (:obj:`Path`): Folder where to copy the file.
+        mode (str): If set to "hardlink", a hard link will be created instead of copying the file
+            whenever possible. Otherwise the file will be copied.
+    """
+    if mode == "hardlink":
+        try:
+            os.link ( source, os.path.join ( destination_folder, os.path.basename ( source ) ) )
+            return
+        except OSError:
+            # The debug folder is probably on another file system. Fall back to copying.
+            pass
+            
+    FastCopy ( source, os.path.join ( destination_folder, os.path.basename ( source ) ) )
+    
+def FastCopy ( source : Path, destination : Path ) -> None:
+    """
+    Copy a file along with its metadata, like `shutil.copy2`, but let the kernel move
+    the data whenever possible.
+    
+    Note:
+        The data is copied with `os.copy_file_range` (which allows server-side or reflink
+        copies on file systems supporting them), falling back to `os.sendfile` and, as a
+        last resort, to a plain read/write loop using a 1 MiB buffer.
+        
+    Args:
+        source (:obj:`Path`): Path of the file to copy.
+        destination (:obj:`Path`): Path of the new file.
+    """
+    with open ( source, 'rb', buffering = 0 ) as source_file, open ( destination, 'wb', buffering = 0 ) as destination_file:
+        source_fd = source_file.fileno()
+        destination_fd = destination_file.fileno()
+        
+        # All the methods below continue from the current file positions, so each one
+        # can pick up where the previous one gave up:
+        remaining = os.fstat ( source_fd ).st_size
+        
+        if hasattr ( os, "copy_file_range" ):
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range ( source_fd, destination_fd, remaining )
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            except OSError:
+                # Not supported for this pair of files (e.g. older kernels, some network file systems).
+                pass
+                
+        if remaining > 0 and hasattr ( os, "sendfile" ):
+            try:
+                while remaining > 0:
+                    copied = os.sendfile ( destination_fd, source_fd, None, remaining )
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            except OSError:
+                pass
+                
+        if remaining > 0:
+            buffer = bytearray ( 1024 * 1024 )
+            view = memoryview ( buffer )
             
-    # obiwan.logger.debug ("SCC NetCDF file: %s" % ( os.path.basename(measurement_path) ))
-    if measurements_debug_dir:
-        measurement_path = obiwan.datalog.task_info ( measurement.Id(), Datalog.Field.SCC_NETCDF_PATH )
-        shutil.copy2 ( measurement_path, debug_dir )
+            while True:
+                size = source_file.readinto ( buffer )
+                if not size:
+                    break
+                    
+                # The destination is not buffered, so a write may take only part of the data:
+                written = 0
+                while written < size:
+                    written += destination_file.write ( view[written:size] )
+                
+    shutil.copystat ( source, destination )
+    
+def UpdateLastProcessedDate ( measurement_date : datetime.datetime ) -> None:
+    """
+    Advance the last processed date stored in the datalog, if the given date is newer.
+    
+    Args:
+        measurement_date (:obj:`datetime.datetime`): Start date of a processed measurement.
+    """
+    # Uploads can finish in any order, so compare and update while holding the lock:
+    with obiwan.datalog.lock:
+        last_processed_date = obiwan.datalog.config.get ( Datalog.Field.LAST_PROCESSED_DATE, None )
+        
+        if last_processed_date is None or measurement_date > last_processed_date:
+            obiwan.datalog.update_config ( (Datalog.Field.LAST_PROCESSED_DATE, measurement_date) )
             
 def Upload (config : Config, measurement : MeasurementSet, **kwargs) -> Union[str, None]:
     """
@@ -136,9 +276,12 @@ def Upload (config : Config, measurement : MeasurementSet, **kwargs) -> Union[st
     Returns:
         `str` containing the SCC measurement ID if the upload is successful, None otherwise.
     """
-    measurement_id = obiwan.datalog.task_info ( measurement.Id(), Datalog.Field.SCC_MEASUREMENT_ID )
-    file_path = obiwan.datalog.task_info ( measurement.Id(), Datalog.Field.SCC_NETCDF_PATH )
-    measurement_date = obiwan.datalog.task_info ( measurement.Id(), Datalog.Field.MEASUREMENT ).DataFiles()[0].StartDateTime()
+    # Look the task up only once, instead of once for every field we need:
+    task = obiwan.datalog.task ( measurement.Id() ) or {}
+    
+    measurement_id = task.get ( Datalog.Field.SCC_MEASUREMENT_ID, None )
+    file_path = task.get ( Datalog.Field.SCC_NETCDF_PATH, None )
+    measurement_date = measurement.DataFiles()[0].StartDateTime()
     
     if measurement_id is None:
         obiwan.logger.error ( "Could not determine SCC measurement ID" )
@@ -151,19 +294,29 @@ def Upload (config : Config, measurement : MeasurementSet, **kwargs) -> Union[st
     reprocess = kwargs.get("reprocess", True)
     replace = kwargs.get("replace", True)
     
-    system_id = obiwan.datalog.task_info ( measurement.Id(), Datalog.Field.SYSTEM_ID )
+    system_id = task.get ( Datalog.Field.SYSTEM_ID, None )
     
     if system_id is None:
         obiwan.logger.error ( "Measurement does not belong to any known SCC system." )
         return None
     
     measurement_exists = False
-    existing_measurement, _ = obiwan.scc.client.get_measurement( measurement_id )
     
-    obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.ALREADY_ON_SCC, measurement_exists) )
-    
-    if existing_measurement is not None:
-        measurement_exists = True
+    if replace and not reprocess:
+        # The measurement gets uploaded whether it exists in the SCC or not, so there is
+        # no point in asking the SCC about it first:
+        obiwan.logger.debug ( "Replacing any existing measurement, skipping the SCC lookup.", extra={'scope': measurement_id} )
+        
+        # Whether the measurement was already on the SCC is unknown, so make sure the datalog does not
+        # report the value it was initialized with as if it had been checked:
+        obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.ALREADY_ON_SCC, None) )
+    else:
+        existing_measurement, _ = obiwan.scc.client.get_measurement( measurement_id )
+        
+        if existing_measurement is not None:
+            measurement_exists = True
+            
+        obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.ALREADY_ON_SCC, measurement_exists) )
     
     if measurement_exists and reprocess:
         # Reprocess the measurement and mark it for download
@@ -171,10 +324,7 @@ def Upload (config : Config, measurement : MeasurementSet, **kwargs) -> Union[st
         obiwan.scc.client.rerun_all ( measurement_id, False )
         obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.UPLOADED, True) )
         
-        if obiwan.datalog.config[Datalog.Field.LAST_PROCESSED_DATE] is None:
-            obiwan.datalog.update_config ( (Datalog.Field.LAST_PROCESSED_DATE, measurement_date) )
-        elif measurement_date > obiwan.datalog.config[Datalog.Field.LAST_PROCESSED_DATE]:
-            obiwan.datalog.update_config ( (Datalog.Field.LAST_PROCESSED_DATE, measurement_date) )
+        UpdateLastProcessedDate ( measurement_date )
             
         return measurement_id
     elif measurement_exists and not replace:
@@ -182,23 +332,15 @@ def Upload (config : Config, measurement : MeasurementSet, **kwargs) -> Union[st
         obiwan.logger.debug ( "Measurement already exists in the SCC, skipping reprocessing." )
         obiwan.datalog.update_task ( measurement.Id(), (Datalog.Field.UPLOADED, True) )
         
-        if obiwan.datalog.config[Datalog.Field.LAST_PROCESSED_DATE] is None:
-            obiwan.datalog.update_config ( (Datalog.Field.LAST_PROCESSED_DATE, measurement_date) )
-        elif measurement_date > obiwan.datalog.config[Datalog.Field.LAST_PROCESSED_DATE]:
-            obiwan.datalog.update_config ( (Datalog.Field.LAST_PROCESSED_DATE, measurement_date) )
+        UpdateLastProcessedDate ( measurement_date )
             
         return measurement_id
     
-    measurement_id = os.path.splitext ( os.path.basename(file_path) ) [0]
-    
-    can_download = obiwan.scc.UploadMeasurement ( file_path, system_id, config.maximum_upload_retry_count, replace )
+    can_download = obiwan.scc.UploadMeasurement ( file_path, system_id, config.maximum_upload_retry_count, replace, config.maximum_upload_retry_delay )
 
-    if can_download == True:
+    if can_download:
         obiwan.logger.info ( "Successfully uploaded to SCC", extra={'scope': measurement_id})
-        if obiwan.datalog.config[Datalog.Field.LAST_PROCESSED_DATE] is None:
-            obiwan.datalog.update_config ( (Datalog.Field.LAST_PROCESSED_DATE, measurement_date) )
-        elif measurement_date > obiwan.datalog.config[Datalog.Field.LAST_PROCESSED_DATE]:
-            obiwan.datalog.update_config ( (Datalog.Field.LAST_PROCESSED_DATE, measurement_date) )
+        UpdateLastProcessedDate ( measurement_date )
             
         obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.UPLOADED, True) )
         return measurement_id
@@ -222,34 +364,29 @@ def LogProcessingParameters (
         start_date (:obj:`datetime`, Optional): Earliest date for data files to be considered.
         end_date (:obj:`datetime`, Optional): Latest date for data files to be considered.
     """
-    log_header_run_time = "Run started at %s" % ( datetime.datetime.now().strftime ( "%Y-%m-%d %H:%M:%S" ) )
-    obiwan.logger.info ( log_header_run_time, extra={'scope': 'start'} )
-
-    log_header_cfg = "Configuration file = %s" % ( config.file_path )
-    obiwan.logger.info ( log_header_cfg )
-
-    log_header_folder = "Data folder = %s" % os.path.abspath ( args.folder )
-    obiwan.logger.info ( log_header_folder )
-
+    # Nothing to format if the header would be filtered out anyway:
+    if not obiwan.logger.isEnabledFor ( logging.INFO ):
+        return
+        
     start_time_text = "N/A" if start_date is None else start_date.strftime ( "%Y-%m-%d %H:%M:%S" )
-    log_header_start_time = "Minimum start time = %s" % ( start_time_text )
-    obiwan.logger.info ( log_header_start_time )
-
     end_time_text = "N/A" if end_date is None else end_date.strftime ( "%Y-%m-%d %H:%M:%S" )
-    log_header_end_time = "Maximum end time = %s" % (end_time_text)
-    obiwan.logger.info ( log_header_end_time )
-
-    log_header_gap = "Maximum gap between measurements (seconds) = %d" % config.max_acceptable_gap
-    obiwan.logger.info ( log_header_gap )
-
-    log_header_minlength = "Minimum measurement set length (seconds) = %d" % config.min_acceptable_length
-    obiwan.logger.info ( log_header_minlength )
-
-    log_header_maxlength = "Maximum measurement set length (seconds) = %d" % config.max_acceptable_length
-    obiwan.logger.info ( log_header_maxlength )
-
-    log_header_alignment = "Measurement set alignment = %s" % config.alignment_type
-    obiwan.logger.info ( log_header_alignment )
+    
+    obiwan.logger.info ( "Run started at %s", obiwan.start_time.strftime ( "%Y-%m-%d %H:%M:%S" ), extra={'scope': 'start'} )
+    
+    log_headers = [
+        "Configuration file = %s" % config.file_path,
+        "Data folder = %s" % args.folder,
+        "Minimum start time = %s" % start_time_text,
+        "Maximum end time = %s" % end_time_text,
+        "Maximum gap between measurements (seconds) = %d" % config.max_acceptable_gap,
+        "Minimum measurement set length (seconds) = %d" % config.min_acceptable_length,
+        "Maximum measurement set length (seconds) = %d" % config.max_acceptable_length,
+        "Measurement set alignment = %s" % config.alignment_type,
+    ]
+    
+    # One record per line, so every header line keeps its own timestamp and scope in the log:
+    for log_header in log_headers:
+        obiwan.logger.info ( log_header )
     
 def LogInterruptedWork () -> None:
     """
@@ -257,26 +394,28 @@ def LogInterruptedWork () -> None:
     still need converting, how many still need uploading and finally how many still need downloading.
     """
     if obiwan.datalog.load() is not None:
-        to_download = [
-            task[Datalog.Field.SCC_MEASUREMENT_ID] for task in obiwan.datalog.tasks.values()
-            if not task[Datalog.Field.DOWNLOADED] and task[Datalog.Field.WANT_DOWNLOAD] and task[Datalog.Field.UPLOADED]
-        ]
-
-        to_convert = [
-            task for task in obiwan.datalog.tasks.values()
-            if not task[Datalog.Field.CONVERTED]
-        ]
-
-        to_upload = [
-            task for task in obiwan.datalog.tasks.values()
-            if not obiwan.datalog.config[Datalog.Field.CONVERT] and task[Datalog.Field.CONVERTED] and not task[Datalog.Field.UPLOADED]
-        ]
+        # Classify all tasks in a single pass. Only the counts are needed, except for
+        # downloads, where several tasks can point to the same SCC measurement.
+        convert_only = obiwan.datalog.config.get ( Datalog.Field.CONVERT, False )
+        
+        to_download = set()
+        to_convert = 0
+        to_upload = 0
         
-        if len(to_download) > 0 or len(to_convert) > 0 or len(to_upload) > 0:
+        for task in obiwan.datalog.tasks.values():
+            if not task[Datalog.Field.CONVERTED]:
+                to_convert += 1
+            elif not task[Datalog.Field.UPLOADED]:
+                if not convert_only:
+                    to_upload += 1
+            elif task[Datalog.Field.WANT_DOWNLOAD] and not task[Datalog.Field.DOWNLOADED]:
+                to_download.add ( task[Datalog.Field.SCC_MEASUREMENT_ID] )
+                
+        if len(to_download) > 0 or to_convert > 0 or to_upload > 0:
             obiwan.logger.warning ("Found previous unfinished tasks")
-            obiwan.logger.warning (f"Not converted: {len(to_convert)}, not uploaded: {len(to_upload)}, not downloaded: {len(to_download)} ")
+            obiwan.logger.warning ( "Not converted: %d, not uploaded: %d, not downloaded: %d", to_convert, to_upload, len(to_download) )
             
-def DownloadMeasurements ( wait : bool = True ) -> None:
+def DownloadMeasurements ( wait : bool = True, max_workers : int = 1, poll_interval : float = 10 ) -> None:
     """
     Download measurements from the SCC.
     
@@ -284,62 +423,334 @@ def DownloadMeasurements ( wait : bool = True ) -> None:
         The list of measurements that need to be downloaded is computed from the
         internal obiwan.datalog of obiwan.
         
+        Measurements which need waiting for are polled together, once every `poll_interval`
+        seconds, and each one is downloaded as soon as the SCC has finished processing it.
+        
     Args:
         wait (bool): If True, the method will wait for each measurement to finish processing
             on the SCC. If False, the method will only download measurements that already
             have been processed and will not wait for others.
+        max_workers (int): Maximum number of measurements to download at the same time.
+        poll_interval (float): Time, in seconds, between two checks of the SCC processing status.
     """
-    seen = set()
-    to_download= [
-        task for task in obiwan.datalog.tasks.values()
-        if task[Datalog.Field.SCC_MEASUREMENT_ID] not in seen and not seen.add(task[Datalog.Field.SCC_MEASUREMENT_ID]) and
-        task[Datalog.Field.WANT_DOWNLOAD] and not task[Datalog.Field.DOWNLOADED]
-    ]
+    # Only download each SCC measurement once, even if multiple tasks point to it:
+    to_download = {
+        task[Datalog.Field.SCC_MEASUREMENT_ID]: task for task in obiwan.datalog.tasks.values()
+        if task[Datalog.Field.WANT_DOWNLOAD] and not task[Datalog.Field.DOWNLOADED]
+    }.values()
 
-    for task in to_download:
-        measurement = task[Datalog.Field.MEASUREMENT]
+    # Downloads are done concurrently. The datalog is only updated from this thread,
+    # as the results come in.
+    with WorkerPool ( max_workers ) as executor:
+        futures = {}
+        pending = {}
         
-        if task[Datalog.Field.WAIT_ENABLED]:
-            result = obiwan.scc.client.monitor_processing ( task[Datalog.Field.SCC_MEASUREMENT_ID], exit_if_missing = not task[Datalog.Field.WAIT_ENABLED] )
-            obiwan.logger.debug ( "Waiting for processing to finish and downloading files...", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
-        else:
-            result, _ = obiwan.scc.client.get_measurement(task[Datalog.Field.SCC_MEASUREMENT_ID])
+        for task in to_download:
+            if task[Datalog.Field.WAIT_ENABLED]:
+                pending[ task[Datalog.Field.SCC_MEASUREMENT_ID] ] = task
+            else:
+                futures[ executor.submit ( FetchMeasurement, task ) ] = task
+                
+        # The processing status is checked at most once per `poll_interval`, no matter
+        # how often downloads finish in the meantime:
+        next_poll = time.monotonic()
+        
+        while pending or futures:
+            if pending and time.monotonic() >= next_poll:
+                for scc_id, task in list ( pending.items() ):
+                    if not IsProcessing ( scc_id ):
+                        del pending[ scc_id ]
+                        futures[ executor.submit ( FetchMeasurement, task ) ] = task
+                        
+                next_poll = time.monotonic() + poll_interval
+                
+                if pending:
+                    obiwan.logger.debug ( "Waiting for %d measurements to finish processing", len(pending) )
+                
+            timeout = max ( next_poll - time.monotonic(), 0 ) if pending else None
             
-        try:
-            if result is not None:
+            if not futures:
+                time.sleep ( timeout or 0 )
+                continue
+                
+            done, _ = wait_futures ( futures, timeout = timeout, return_when = FIRST_COMPLETED )
+            
+            for future in done:
+                task = futures.pop ( future )
+                measurement = task[Datalog.Field.MEASUREMENT]
+                
                 try:
-                    scc_version = obiwan.scc.GetSCCVersion ( obiwan.scc.client.output_dir, task[Datalog.Field.SCC_MEASUREMENT_ID] )
+                    result = future.result()
                 except Exception as e:
-                    if result.elpp != 127:
-                        obiwan.logger.error ( "No SCC products found", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
-                        obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "No SCC products found") )
-                    else:
-                        obiwan.logger.error ( "Unknown error in SCC products", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
-                        obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "Unknown error in SCC products") )
-                    
-                    scc_version = "Unknown SCC Version! Check preprocessed NetCDF files."
-                    obiwan.logger.error ( e )
+                    obiwan.logger.error ( "Error downloading SCC products: %s", e, extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
+                    obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "Error downloading SCC products") )
                     continue
                     
-                obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.DOWNLOADED, True) )
-                obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, obiwan.scc.client.output_dir) )
-                obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.SCC_VERSION, scc_version) )
-            elif task[Datalog.Field.WAIT_ENABLED]:
-                obiwan.logger.error ( "Download failed", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
-                obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "Error downloading SCC products") )
-            else:
-                obiwan.logger.info ( "Measurement was not yet processed by the SCC, will not wait for it.", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
-                obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "SCC did not finish processing in due time.") )
-        except Exception as e:
-            obiwan.logger.error ( f"Error downloading SCC products: {str(e)}" )
+                ProcessDownloadResult ( task, result )
+                
+def IsProcessing ( scc_id : str ) -> bool:
+    """
+    Check whether the SCC is still processing a measurement.
+    
+    Args:
+        scc_id (str): SCC measurement ID.
+        
+    Returns:
+        True if the measurement is still being processed. If the status can't be retrieved,
+        False is returned so the download attempt can report the problem.
+    """
+    try:
+        measurement, _ = obiwan.scc.client.get_measurement ( scc_id )
+    except Exception as e:
+        obiwan.logger.debug ( "Could not check processing status: %s", e, extra={'scope': scc_id} )
+        return False
+        
+    return measurement is not None and measurement.is_running
+    
+def FetchMeasurement ( task : dict ) -> object:
+    """
+    Retrieve a measurement from the SCC, downloading its products if processing is done.
+    
+    Args:
+        task (dict): The datalog task of the measurement.
+        
+    Returns:
+        The measurement information as returned by `scc_access`, or None if the measurement
+        could not be retrieved.
+    """
+    if task[Datalog.Field.WAIT_ENABLED]:
+        obiwan.logger.debug ( "Waiting for processing to finish and downloading files...", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
+        return obiwan.scc.client.monitor_processing ( task[Datalog.Field.SCC_MEASUREMENT_ID], exit_if_missing = not task[Datalog.Field.WAIT_ENABLED] )
+        
+    result, _ = obiwan.scc.client.get_measurement(task[Datalog.Field.SCC_MEASUREMENT_ID])
+    return result
+    
+def ProcessDownloadResult ( task : dict, result : object ) -> None:
+    """
+    Update the datalog based on the result of a measurement download.
+    
+    Args:
+        task (dict): The datalog task of the measurement.
+        result (object): The measurement information as returned by `FetchMeasurement`.
+    """
+    measurement = task[Datalog.Field.MEASUREMENT]
+    
+    try:
+        if result is not None:
+            try:
+                scc_version = obiwan.scc.GetSCCVersion ( obiwan.scc.client.output_dir, task[Datalog.Field.SCC_MEASUREMENT_ID] )
+            except Exception as e:
+                if result.elpp != 127:
+                    obiwan.logger.error ( "No SCC products found", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
+                    obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "No SCC products found") )
+                else:
+                    obiwan.logger.error ( "Unknown error in SCC products", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
+                    obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "Unknown error in SCC products") )
+                
+                scc_version = "Unknown SCC Version! Check preprocessed NetCDF files."
+                obiwan.logger.error ( "%s", e, extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
+                return
+                
+            obiwan.datalog.update_task_many ( measurement.Id(), [
+                (Datalog.Field.DOWNLOADED, True),
+                (Datalog.Field.RESULT, obiwan.scc.client.output_dir),
+                (Datalog.Field.SCC_VERSION, scc_version)
+            ] )
+        elif task[Datalog.Field.WAIT_ENABLED]:
+            obiwan.logger.error ( "Download failed", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
             obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "Error downloading SCC products") )
+        else:
+            obiwan.logger.info ( "Measurement was not yet processed by the SCC, will not wait for it.", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
+            obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "SCC did not finish processing in due time.") )
+    except Exception as e:
+        obiwan.logger.error ( "Error downloading SCC products: %s", e, extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]} )
+        obiwan.datalog.update_task( measurement.Id(), (Datalog.Field.RESULT, "Error downloading SCC products") )
+    
+def ConvertTask ( task : dict, index : int, count : int ) -> Optional[dict]:
+    """
+    Convert the measurement of a datalog task to an SCC NetCDF input file, if needed.
+    
+    Args:
+        task (dict): The datalog task to process.
+        index (int): Index of the task, only used for logging.
+        count (int): Total number of tasks, only used for logging.
+        
+    Returns:
+        The task if the measurement was successfully converted, None otherwise.
+    """
+    try:
+        obiwan.logger.info ( "Started task %d/%d", index + 1, count )
+        
+        needs_convert = not task[Datalog.Field.CONVERTED]
+        needs_debug = task[Datalog.Field.WANT_DEBUG]
+        
+        if needs_convert:
+            Convert ( obiwan.config, task[Datalog.Field.MEASUREMENT] )
+            
+        file_path = task[Datalog.Field.SCC_NETCDF_PATH]
+        measurement_id = task[Datalog.Field.SCC_MEASUREMENT_ID]
+            
+        if not measurement_id or not file_path:
+            obiwan.logger.error ("Measurement could not be converted.")
+            return None
+            
+        obiwan.logger.info ( "Successfully converted measurement to SCC NetCDF format: %s", os.path.basename(file_path) )
+        
+        if needs_debug:
+            if obiwan.config.measurements_debug_dir:
+                DebugMeasurement (
+                    task[Datalog.Field.MEASUREMENT],
+                    obiwan.config.measurements_debug_dir,
+                    obiwan.config.measurements_debug_mode,
+                    obiwan.config.measurements_debug_copy_workers
+                )
+                
+    except Exception as e:
+        obiwan.logger.error ( "Error processing task: %s", e, extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]})
+        return None
+        
+    return task
+        
+def UploadTask ( task : dict ) -> None:
+    """
+    Upload the measurement of a converted datalog task to the SCC, if needed.
+    
+    Args:
+        task (dict): The converted datalog task, e.g. as returned by `ConvertTask`.
+    """
+    try:
+        needs_upload = task[Datalog.Field.WANT_UPLOAD] and not task[Datalog.Field.UPLOADED]
+        
+        if needs_upload:
+            Upload (
+                config = obiwan.config,
+                measurement = task[Datalog.Field.MEASUREMENT],
+                reprocess = task[Datalog.Field.REPROCESS_ENABLED],
+                replace = task[Datalog.Field.REPLACE_ENABLED]
+            )
+            
+    except Exception as e:
+        obiwan.logger.error ( "Error processing task: %s", e, extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]})
+        
+def ProcessTasks ( tasks : List[dict], convert_workers : int = 1, upload_workers : int = 1, max_pending_uploads : Optional[int] = None ) -> None:
+    """
+    Convert and upload the measurements of the given datalog tasks.
+    
+    Note:
+        Conversion and upload run in two separate worker pools. Each task is handed
+        to the upload pool as soon as it was converted, so uploading a measurement
+        overlaps with converting the next ones.
+        
+        Conversion is not allowed to run too far ahead of the uploads: once
+        `max_pending_uploads` converted measurements are waiting for (or being)
+        uploaded, no new conversion is started until one of them is done. This keeps
+        the work which needs redoing after an interruption small.
+        
+    Args:
+        tasks (:obj:`list` of dict): The datalog tasks to process.
+        convert_workers (int): Maximum number of measurements to convert at the same time.
+        upload_workers (int): Maximum number of measurements to upload at the same time.
+        max_pending_uploads (int, optional): Maximum number of converted measurements waiting
+            to be uploaded. Defaults to twice the number of upload workers.
+    """
+    if max_pending_uploads is None:
+        max_pending_uploads = 2 * upload_workers
+        
+    total = len(tasks)
+    queued = iter ( enumerate ( tasks ) )
+    conversions = set()
+    uploads = set()
+    
+    with WorkerPool ( upload_workers ) as uploader, WorkerPool ( convert_workers ) as converter:
+        while True:
+            # Keep the converters busy, as long as the uploads keep up:
+            while len(conversions) < convert_workers and len(conversions) + len(uploads) < convert_workers + max_pending_uploads:
+                item = next ( queued, None )
+                
+                if item is None:
+                    break
+                    
+                index, task = item
+                conversions.add ( converter.submit ( ConvertTask, task, index, total ) )
+                
+            if not conversions and not uploads:
+                break
+                
+            done, _ = wait_futures ( conversions | uploads, return_when = FIRST_COMPLETED )
+            
+            for future in done:
+                if future in conversions:
+                    conversions.remove ( future )
+                    task = future.result()
+                    
+                    if task is not None:
+                        uploads.add ( uploader.submit ( UploadTask, task ) )
+                else:
+                    uploads.remove ( future )
+                    
+            obiwan.datalog.maybe_flush()
+            
+class TerminationRequest ( SystemExit ):
+    """
+    Raised in the main thread when obiwan is asked to terminate (SIGTERM).
+    """
+    
+def RequestTermination ( signum, frame ) -> None:
+    """
+    SIGTERM handler, stopping the work done in the main thread.
+    """
+    raise TerminationRequest ( 1 )
+    
+@contextmanager
+def WorkerPool ( max_workers : int ):
+    """
+    Thread pool which, when left because of an exception (e.g. obiwan being terminated), cancels the work
+    which did not start yet, and does not wait for the work which did.
+    
+    Note:
+        Leaving a :obj:`ThreadPoolExecutor` `with` block waits for all submitted work, which can take
+        indefinitely long when it is waiting on the SCC.
+    
+    Args:
+        max_workers (int): Maximum number of threads in the pool.
+    """
+    executor = ThreadPoolExecutor ( max_workers = max_workers )
+    
+    try:
+        yield executor
+    except BaseException:
+        executor.shutdown ( wait = False, cancel_futures = True )
+        raise
+        
+    executor.shutdown ( wait = True )
     
 def main ():
+    # Only the application itself handles termination, not every module importing obiwan:
+    signal.signal ( signal.SIGTERM, RequestTermination )
+    
+    try:
+        Run ()
+    except ( TerminationRequest, KeyboardInterrupt ):
+        # Interrupting with Ctrl-C (SIGINT) is handled just like SIGTERM:
+        obiwan.logger.warning ( "Terminated. Saving processing state..." )
+        obiwan.datalog.flush()
+        logging.shutdown()
+        
+        # Worker threads might still be waiting on the SCC, and the interpreter would wait for
+        # them before exiting. The processing state is saved, so we can leave right away:
+        os._exit ( 1 )
+        
+def Run ():
+    """
+    Scan the data folder, then convert, upload and download the measurements found, as requested
+    by the command line arguments.
+    """
     # Initialize data repository for the required folder
     lidarchive = Lidarchive (
         measurement_identifiers = obiwan.config.measurement_identifiers,
         dark_identifiers = obiwan.config.dark_identifiers,
-        tests = obiwan.config.test_lists
+        tests = obiwan.config.test_lists,
+        cache_path = os.path.join ( obiwan.config.netcdf_out_dir, ObiwanApplication.CACHE_FILE_NAME )
     )
     lidarchive.SetFolder (obiwan.args.folder)
     
@@ -348,8 +759,8 @@ def main ():
     
     obiwan.logger.info ( "Identifying measurements. This can take a few minutes...")
 
-    lidarchive.ReadFolder (obiwan.args.startdate, obiwan.args.enddate)
-    obiwan.logger.debug ( "Found %d files" % len(lidarchive.Measurements()) )
+    lidarchive.ReadFolderParallel (obiwan.args.startdate, obiwan.args.enddate, workers = obiwan.args.scan_workers, processes = obiwan.args.scan_processes)
+    obiwan.logger.debug ( "Found %d files", len(lidarchive.Measurements()) )
     
     # Check if we have any interrupted work from past runs and print a message if so
     if obiwan.args.resume:
@@ -364,10 +775,9 @@ def main ():
     obiwan.datalog.update_config((Datalog.Field.REPLACE, obiwan.args.replace), save=False)
     obiwan.datalog.update_config((Datalog.Field.DOWNLOAD, obiwan.args.download), save=False)
     obiwan.datalog.update_config((Datalog.Field.WAIT, obiwan.args.wait), save=False)
-    obiwan.datalog.update_config((Datalog.Field.FOLDER, os.path.abspath(obiwan.args.folder)), save=False)
+    obiwan.datalog.update_config((Datalog.Field.FOLDER, obiwan.args.folder), save=False)
     obiwan.datalog.update_config((Datalog.Field.LAST_PROCESSED_DATE, None), save=False)
     obiwan.datalog.update_config((Datalog.Field.DEBUG, obiwan.args.debug), save=False)
-    obiwan.datalog.update_config((Datalog.Field.FOLDER, obiwan.args.folder), save = False)
     obiwan.datalog.update_config((Datalog.Field.CONFIGURATION_FILE, obiwan.config), save=True)
         
     scanned_measurements = lidarchive.ContinuousMeasurements (
@@ -377,57 +787,33 @@ def main ():
         min_dark_length = obiwan.config.min_acceptable_dark_length,
         alignment_type = obiwan.config.alignment_type
     )
-    obiwan.logger.info ( "Identified %d different continuous measurements" % (len (scanned_measurements)) )
+    obiwan.logger.info ( "Identified %d different continuous measurements", len (scanned_measurements) )
 
-    for measurement in scanned_measurements:
-        inserted = obiwan.datalog.initialize_task ( measurement )
-        
-        if not inserted:
-            obiwan.logger.debug ( f"Measurement {measurement.Id()} needed resuming, but was scanned again this time. Will reprocess entirely." )
-        
+    skipped_measurements = obiwan.datalog.initialize_tasks ( scanned_measurements )
+    
+    for measurement in skipped_measurements:
+        obiwan.logger.debug ( "Measurement %s needed resuming, but was scanned again this time. Will reprocess entirely.", measurement.Id() )
         
-    obiwan.logger.info ( f"Starting processing {len(obiwan.datalog.tasks)} tasks" )
+    # Take a snapshot of the tasks, so the processing order stays the same even though
+    # the datalog is updated from the worker threads:
+    tasks = list ( obiwan.datalog.tasks.values() )
     
-    # Main loop:
-    for index, task in enumerate(obiwan.datalog.tasks.values()):
-        try:
-            obiwan.logger.info ( f"Started task {index+1}/{len(obiwan.datalog.tasks)}" )
-            
-            needs_convert = not task[Datalog.Field.CONVERTED]
-            needs_upload = task[Datalog.Field.WANT_UPLOAD] and not task[Datalog.Field.UPLOADED]
-            needs_download = task[Datalog.Field.WANT_DOWNLOAD] and not task[Datalog.Field.DOWNLOADED]
-            needs_debug = task[Datalog.Field.WANT_DEBUG]
-            
-            if needs_convert:
-                Convert ( obiwan.config, task[Datalog.Field.MEASUREMENT] )
-                
-            file_path = task[Datalog.Field.SCC_NETCDF_PATH]
-            measurement_id = task[Datalog.Field.SCC_MEASUREMENT_ID]
-                
-            if not measurement_id or not file_path:
-                obiwan.logger.error ("Measurement could not be converted.")
-                continue
-                
-            obiwan.logger.info ( f"Successfully converted measurement to SCC NetCDF format: {os.path.basename(file_path)}" )
-            
-            if needs_debug:
-                if obiwan.config.measurements_debug_dir:
-                    DebugMeasurement(task[Datalog.Field.MEASUREMENT], obiwan.config.measurements_debug_dir)
-                    
-            if needs_upload:
-                Upload (
-                    config = obiwan.config,
-                    measurement = task[Datalog.Field.MEASUREMENT],
-                    reprocess = task[Datalog.Field.REPROCESS_ENABLED],
-                    replace = task[Datalog.Field.REPLACE_ENABLED]
-                )
-                
-        except Exception as e:
-            obiwan_logger.error (f"Error processing task: {str(e)}", extra={'scope': task[Datalog.Field.SCC_MEASUREMENT_ID]})
+    obiwan.logger.info ( "Starting processing %d tasks", len(tasks) )
+    
+    # Main loop. Each task is uploaded right after it was converted, while the
+    # next ones are still being converted:
+    ProcessTasks (
+        tasks,
+        convert_workers = obiwan.args.convert_workers,
+        upload_workers = obiwan.args.upload_workers or obiwan.config.maximum_concurrent_uploads
+    )
+        
+    obiwan.datalog.flush()
                 
     if obiwan.args.download:
         obiwan.logger.info ( "Downloading SCC products" )
-        DownloadMeasurements ()
+        DownloadMeasurements ( max_workers = obiwan.config.maximum_concurrent_downloads )
+        obiwan.datalog.flush()
     else:
         obiwan.logger.info("SCC products download is not enabled. You can enable it with --download.")
         
@@ -435,8 +821,7 @@ def main ():
         obiwan.datalog.write_csv()
 
     # Delete swap file
-    obiwan.datalog.reset_tasks()
-    obiwan.datalog.save()
+    obiwan.datalog.discard()
     sys.exit (0)
 
 if __name__ == "__main__":
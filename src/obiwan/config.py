@@ -12,6 +12,7 @@ import yaml
 import traceback
 
 DEFAULT_TESTS_FOLDER = "data/tests"
+DEBUG_MODES = [ "copy", "hardlink", "tar" ]
 
 class ExtraNCParameters:
     """
@@ -266,6 +267,10 @@ class Config:
         scc_website_credentials (:obj:`tuple` of :obj:`str`): User credentials for the SCC platform.
         scc_base_url (:obj:`str`): HTTP URL of the SCC website.
         maximum_upload_retry_count (int): Maximum number of retries to perform in case of upload errors.
+        maximum_upload_retry_delay (int): Maximum delay, in seconds, between two upload retries. Retries back off exponentially
+            up to this value. Defaults to 30.
+        maximum_concurrent_downloads (int): Maximum number of measurements to download from the SCC at the same time.
+        maximum_concurrent_uploads (int): Maximum number of measurements to upload to the SCC at the same time.
         measurement_identifiers (:obj:`list` of :obj:`str`): List of identifiers for real atmosphere measurements.
         dark_identifiers (:obj:`list` of :obj:`str`): List of identifiers for dark measurements.
         max_acceptable_gap (int): Maximum acceptable time gap, in seconds, between two measurement files in order to consider them as being
@@ -276,6 +281,8 @@ class Config:
             reasonably sized chunks during conversion (common value is 3600 for 1 hour long measurement sets).
         alignment_type (:obj:`AlignmentType`): Type of alignment to perform on the identified measurements. Defaults to `AlignmentType.NONE`.
         measurements_debug_dir (:obj:`Path`): Path to the folder where to copy raw and NetCDF files when debugging measurement identification and splitting.
+        measurements_debug_mode (str): How to store debug files: "copy", "hardlink" or "tar". Defaults to "copy".
+        measurements_debug_copy_workers (int): Number of debug files to copy at the same time. Defaults to 4.
         tests_dir (:obj:`Path`): Path to the folder where to copy raw files identified as test files.
         test_lists (:obj:`list` of :obj:`LidarTest`): List of tests to search for in the measurement files.
     """
@@ -321,6 +328,9 @@ class Config:
         self.scc_website_credentials = tuple ( config['scc_website_credentials'] )
         self.scc_base_url = config['scc_base_url']
         self.maximum_upload_retry_count = config['scc_maximum_upload_retries']
+        self.maximum_upload_retry_delay = config.get('scc_maximum_upload_retry_delay', 30)
+        self.maximum_concurrent_downloads = config.get('scc_maximum_concurrent_downloads', 4)
+        self.maximum_concurrent_uploads = config.get('scc_maximum_concurrent_uploads', 3)
         
         # Licel header location types:
         if type(config['measurement_identifiers']) is str:
@@ -353,6 +363,13 @@ class Config:
         
         # Measurements debug:
         self.measurements_debug_dir = Config.compute_path ( config['measurements_debug_dir'], root_folder = config_dir )
+        self.measurements_debug_mode = config.get('measurements_debug_mode', 'copy')
+        
+        if self.measurements_debug_mode not in DEBUG_MODES:
+            logger.error ( f"Invalid measurements_debug_mode: {self.measurements_debug_mode}. Will copy debug files." )
+            self.measurements_debug_mode = 'copy'
+            
+        self.measurements_debug_copy_workers = config.get('measurements_debug_copy_workers', 4)
         
         # Test folder:
         self.tests_dir = Config.compute_path (DEFAULT_TESTS_FOLDER, root_folder = config_dir)
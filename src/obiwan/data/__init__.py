@@ -1,15 +1,24 @@
 from collections import OrderedDict
 from datetime import datetime
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 from typing import Union, List, Dict
 
 from obiwan.data.types import FileType
+
+# Number of bytes read from the beginning of a file in order to guess its type.
+SNIFF_LENGTH = 256
     
+@lru_cache ( maxsize = 1 )
 def available_raw_file_readers () -> Dict[FileType, 'LidarReader']:
     """
     Get all available raw lidar data file readers.
     
+    Note:
+        The readers are only looked up once, and the same dictionary is returned
+        on every following call. It must not be modified by callers.
+    
     Returns:
         :obj:`Dict` containing :obj:`LidarReader` parsers, keyed by the
         :obj:`FileType` they are associated with.
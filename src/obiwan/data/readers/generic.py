@@ -1,18 +1,74 @@
 import datetime
+import importlib
+import os
+import sys
 
 from pathlib import Path
+from types import ModuleType
 from typing import Union, List, Dict, Tuple
 
 from obiwan.config import Config
 from obiwan.data.types import FileInfo
 from obiwan.repository import MeasurementSet
 
+# Extra NetCDF parameters modules which were already imported, keyed by their file path.
+_netcdf_parameters_modules = {}
+
+def load_netcdf_parameters ( file_path : Path ) -> ModuleType:
+    """
+    Import an extra NetCDF parameters file, as used by atmospheric-lidar, as a Python module.
+    
+    Note:
+        Modules are cached based on their file path, so each parameters file will only
+        be imported once. This also avoids growing `sys.path` on every conversion.
+    
+    Args:
+        file_path (:obj:`Path`): Path to the extra NetCDF parameters file.
+        
+    Returns:
+        The imported parameters module.
+    """
+    file_path = str ( file_path )
+    module = _netcdf_parameters_modules.get ( file_path, None )
+    
+    if module is None:
+        module_folder = os.path.dirname ( file_path )
+        if module_folder not in sys.path:
+            sys.path.append ( module_folder )
+            
+        module_name = os.path.basename ( file_path )
+        if module_name.endswith ('.py'):
+            module_name = module_name[:-3]
+            
+        module = importlib.import_module ( module_name )
+        _netcdf_parameters_modules[ file_path ] = module
+        
+    return module
+
 class LidarReader:
     """
     Abstract class for raw lidar data files readers. The methods of this class should be implemented by
     children for their respective supported file formats.
     """
     
+    @staticmethod
+    def sniff ( header : bytes ) -> bool:
+        """
+        Quickly check if a file could be read by this reader, based on the first bytes of the file.
+        This is used to avoid calling `read_info()` on files which are clearly of another type.
+        
+        Note:
+            This check is allowed to give false positives, but it must never reject a file which
+            `read_info()` would be able to read. The default implementation accepts every file.
+        
+        Args:
+            header (bytes): The first bytes of the file (at most `SNIFF_LENGTH`).
+            
+        Returns:
+            True if the file could be of the type handled by this reader, False otherwise.
+        """
+        return True
+        
     @staticmethod
     def read_info ( file : Path ) -> Union[FileInfo, None]:
         """
@@ -3,24 +3,57 @@ from obiwan.data.types import FileInfo, ChannelInfo
 from obiwan.log import Datalog, logger
 from obiwan.repository import MeasurementSet
 
-from .generic import LidarReader
+from .generic import LidarReader, load_netcdf_parameters
 
 from atmospheric_lidar.licel import LicelFile, LicelLidarMeasurement
 
 from pathlib import Path
 
-import importlib
 import os
-import sys
+import re
 import traceback
 
 from typing import Union, List, Tuple
 
+# Start and end of the measurement, as written in the second line of the Licel header (e.g. 23/11/2017 10:20:30):
+_licel_date_time = re.compile ( rb'\d\d/\d\d/\d\d\d\d \d\d:\d\d:\d\d' )
+
 class LicelReader(LidarReader):
     """
     Reader for raw Licel data files in the older specification format.
     """
     
+    @staticmethod
+    def sniff ( header : bytes ) -> bool:
+        """
+        Quickly check if a file could be a Licel file, based on the first bytes of the file.
+        
+        Note:
+            Licel files start with a text header. The first line holds the file name, and the
+            second one the location followed by the start and end date and time of the measurement.
+        
+        Args:
+            header (bytes): The first bytes of the file.
+            
+        Returns:
+            True if the file could be a Licel file, False otherwise.
+        """
+        lines = header.split ( b'\n', 2 )
+        
+        if len ( lines ) < 2:
+            return False
+            
+        first_line = lines[0].rstrip ( b'\r' ).strip()
+        
+        if len ( first_line ) < 1 or not all ( 32 <= byte < 127 for byte in first_line ):
+            return False
+            
+        if len ( lines ) < 3:
+            # The second line did not fit in the header we were given, so we can't check it.
+            return True
+            
+        return len ( _licel_date_time.findall ( lines[1] ) ) >= 2
+        
     @staticmethod
     def read_info ( file : Path ) -> Union[FileInfo, None]:
         """
@@ -119,12 +152,7 @@ class LicelReader(LidarReader):
             return None, None
             
         try:
-            sys.path.append ( os.path.dirname (netcdf_parameters_path) )
-            netcdf_parameters_filename = os.path.basename ( netcdf_parameters_path )
-            if netcdf_parameters_filename.endswith ('.py'):
-                netcdf_parameters_filename = netcdf_parameters_filename[:-3]
-
-            nc_parameters_module = importlib.import_module ( netcdf_parameters_filename )
+            nc_parameters_module = load_netcdf_parameters ( netcdf_parameters_path )
 
             class CustomLidarMeasurement(LicelLidarMeasurement):
                 extra_netcdf_parameters = nc_parameters_module
@@ -158,12 +186,16 @@ class LicelReader(LidarReader):
             if not dark_files[-1].NumberOfShotsSimilarTo ( dark_files[0], max_relative_diff = .05 ):
                 logger.warning ("Found different number of laser shots in the last recorded dark file. Removing it to avoid SCC processing errors.", extra={'scope': measurement_id})
 
+        # Build the file lists once, they are reused if the first conversion attempt fails:
+        data_paths = [ file.Path() for file in data_files ]
+        dark_paths = [ file.Path() for file in dark_files ]
+
         try:
             try:
-                custom_measurement = CustomLidarMeasurement ( file_list = [file.Path() for file in data_files], use_id_as_name=False )
+                custom_measurement = CustomLidarMeasurement ( file_list = data_paths, use_id_as_name=False )
                 
-                if len(measurement_set.DarkFiles()) > 0:
-                    custom_measurement.dark_measurement = CustomLidarMeasurement ( file_list = [file.Path() for file in dark_files], use_id_as_name=False )
+                if len(dark_paths) > 0:
+                    custom_measurement.dark_measurement = CustomLidarMeasurement ( file_list = dark_paths, use_id_as_name=False )
                     
                 custom_measurement = custom_measurement.subset_by_scc_channels ()
             except (IOError, ValueError):
@@ -173,10 +205,10 @@ class LicelReader(LidarReader):
                 # A ValueError can be thrown if there are no common channels between the Licel file
                 # and the extra_netcdf_parameters configuration file. In this case, it might be that the configuration file
                 # uses digitizer IDs as channel identifiers.
-                custom_measurement = CustomLidarMeasurement ( file_list = [file.Path() for file in data_files], use_id_as_name=True )
+                custom_measurement = CustomLidarMeasurement ( file_list = data_paths, use_id_as_name=True )
                 
-                if len(measurement_set.DarkFiles()) > 0:
-                    custom_measurement.dark_measurement = CustomLidarMeasurement ( file_list = [file.Path() for file in dark_files], use_id_as_name=True )
+                if len(dark_paths) > 0:
+                    custom_measurement.dark_measurement = CustomLidarMeasurement ( file_list = dark_paths, use_id_as_name=True )
                     
                 custom_measurement = custom_measurement.subset_by_scc_channels ()
                 
@@ -3,15 +3,14 @@ from obiwan.data.types import FileInfo, ChannelInfo
 from obiwan.log import Datalog, logger
 from obiwan.repository import MeasurementSet
 
-from .generic import LidarReader
+from .generic import LidarReader, load_netcdf_parameters
+from .licel import LicelReader
 
 from atmospheric_lidar.licelv2 import LicelFileV2, LicelLidarMeasurementV2
 
 from pathlib import Path
 
-import importlib
 import os
-import sys
 import traceback
 
 from typing import Union, List, Tuple
@@ -21,6 +20,23 @@ class LicelV2Reader(LidarReader):
     Reader for raw Licel data files in the newer specification format (v2).
     """
     
+    @staticmethod
+    def sniff ( header : bytes ) -> bool:
+        """
+        Quickly check if a file could be a Licel file, based on the first bytes of the file.
+        
+        Note:
+            Both Licel specifications start with the same kind of text header, so this
+            cannot tell them apart.
+        
+        Args:
+            header (bytes): The first bytes of the file.
+            
+        Returns:
+            True if the file could be a Licel file, False otherwise.
+        """
+        return LicelReader.sniff ( header )
+        
     @staticmethod
     def read_info ( file : Path ) -> Union[FileInfo, None]:
         """
@@ -125,12 +141,7 @@ class LicelV2Reader(LidarReader):
             return None, None
             
         try:
-            sys.path.append ( os.path.dirname (netcdf_parameters_path) )
-            netcdf_parameters_filename = os.path.basename ( netcdf_parameters_path )
-            if netcdf_parameters_filename.endswith ('.py'):
-                netcdf_parameters_filename = netcdf_parameters_filename[:-3]
-
-            nc_parameters_module = importlib.import_module ( netcdf_parameters_filename )
+            nc_parameters_module = load_netcdf_parameters ( netcdf_parameters_path )
 
             class CustomLidarMeasurement(LicelLidarMeasurementV2):
                 extra_netcdf_parameters = nc_parameters_module
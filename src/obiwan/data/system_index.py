@@ -80,6 +80,7 @@ class SystemIndex:
     
     Attributes:
         systems (:obj:`List` of :obj:`System`): List of identified lidar systems from the sample files
+        system_ids (:obj:`Dict` of int): Cache of already identified system IDs, keyed by the channel configuration.
     """
     def __init__ (self, folder : Path = None):
         """
@@ -87,6 +88,7 @@ class SystemIndex:
             
         """
         self.systems = []
+        self.system_ids = {}
         
         if folder is not None:
             self.ReadFolder (folder)
@@ -100,6 +102,9 @@ class SystemIndex:
         """
         files = [os.path.join(folder, f) for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))]
         
+        # Known systems are changing so previous results are no longer valid:
+        self.system_ids = {}
+        
         for file in files:
             try:
                 self.systems.append (System (file))
@@ -116,6 +121,13 @@ class SystemIndex:
         Args
         system (:obj:`MeasurementFile`): The data file to get the system ID for.
         """
+        # Files with the same channels always belong to the same system, so we only
+        # need to search the known systems once for each channel configuration:
+        key = tuple ( sorted ( channel.description for channel in measurement.info.channels ) )
+        
+        if key in self.system_ids:
+            return self.system_ids[ key ]
+            
         compatible_ids = []
         
         for s in self.systems:
@@ -128,4 +140,6 @@ class SystemIndex:
         if len(compatible_ids) > 1:
             raise ValueError ( "More than one configuration matches: %s" % compatible_ids )
             
-        return int(compatible_ids[0])
+        self.system_ids[ key ] = int(compatible_ids[0])
+        
+        return self.system_ids[ key ]
@@ -58,7 +58,7 @@ class ChannelInfo:
         self.adcbits = adcbits
         self.analog = analog
         self.active = active
-        self.number_of_shots = number_of_shots,
+        self.number_of_shots = number_of_shots
         self.id = id
 
     def Equals(self, channel : 'ChannelInfo') -> bool:
@@ -71,15 +71,25 @@ class ChannelInfo:
         Returns:
             True if the two channels are identical, False otherwise.
         """
-        if (self.name == channel.name and
-                self.resolution == channel.resolution and
-                self.laser_used == channel.laser_used and
-                self.adcbits == channel.adcbits and
-                self.analog == channel.analog and
-                self.active == channel.active):
-            return True
-
-        return False
+        return self.signature() == channel.signature()
+        
+    def signature(self) -> tuple:
+        """
+        Get the properties which identify this channel, as a hashable value.
+        Two channels are equivalent if and only if they have the same signature.
+        
+        Returns:
+            A tuple containing the name, resolution, laser used, ADC bits, detection mode
+            and active flag of the channel.
+        """
+        return (
+            self.name,
+            self.resolution,
+            self.laser_used,
+            self.adcbits,
+            self.analog,
+            self.active
+        )
         
     @property
     def description (self) -> str:
@@ -2,10 +2,12 @@ import logging
 import pickle
 import os
 import datetime
+import threading
+import time
 
 from enum import Enum
 from pathlib import Path
-from typing import Union, Tuple
+from typing import List, Union, Tuple
 
 from logging import Logger
 
@@ -56,18 +58,36 @@ def set_log_level ( level : int, logger : Logger ) -> None:
 
 class Datalog:
     """
-    Class used to store the current processing state of the application. This is used to instantly
+    Class used to store the current processing state of the application. This is used to
     save to the disk any change in measurement processing progress in a specific swap file,
     which can then be loaded in order to resume interrupted work.
     
     It is also used to transfer data between various modules of the `obiwan` application.
     
+    Note:
+        To avoid rewriting the swap file on every single change, updates are checkpointed
+        in batches: a checkpoint is made once `save_interval` tasks have changed or
+        `save_period` seconds have passed since the last one, whichever comes first.
+        Use `flush()` to force writing any pending changes.
+        
+        A checkpoint only appends the changed tasks to a journal file next to the swap file,
+        so its cost does not grow with the total number of tasks. The full swap file is
+        rewritten, and the journal started over, once `compact_interval` records have been
+        appended to the journal.
+        
+        Updates and writes are serialized through `lock`, so tasks can be processed from
+        multiple threads.
+    
     Attributes:
         tasks (:obj:`Dict` of `object` keyed by `str`): The running tasks of obiwan are stored here,
             and each one of them gets a specific ID based on the measurement it refers to.
         config (:obj:`Dict` of `object` keyed by `str`): The running configuration of obiwan is stored here.
         file_path (:obj:`Path`): The path to the swap file being used.
         csv_path (:obj:`Path`): Path to a CSV log of all the processed measurements.
+        save_interval (int): Number of changed tasks after which a checkpoint is made.
+        save_period (float): Maximum time, in seconds, that changes are kept only in memory.
+        compact_interval (int): Number of journal records after which the full swap file is rewritten.
+        lock (:obj:`threading.RLock`): Lock guarding changes to the datalog state.
     """
     class Field(Enum):
         """
@@ -112,15 +132,35 @@ class Datalog:
         WAIT = "wait"
         DEBUG = "debug"
         
-    def __init__ ( self, file_path : Path = None ):
+    def __init__ ( self, file_path : Path = None, save_interval : int = 50, save_period : float = 5.0, compact_interval : int = 1000 ):
         """
         Args:
             file_path (:obj:`Path`): Path to the swap file where the datalog will be stored.
+            save_interval (int): Number of changed tasks after which a checkpoint is made. Defaults to 50.
+            save_period (float): Maximum time, in seconds, that changes are kept only in memory. Defaults to 5.
+            compact_interval (int): Number of journal records after which the full swap file is rewritten. Defaults to 1000.
         """
         self.tasks = {}
         self.config = {}
         self.file_path = file_path
         self.csv_path = None
+        self.save_interval = save_interval
+        self.save_period = save_period
+        self.compact_interval = compact_interval
+        
+        self.unsaved_tasks = set()
+        self.unsaved_config = False
+        self.last_save = time.monotonic()
+        self.lock = threading.RLock()
+        
+        # The journal only makes sense on top of the swap file it was started with, so
+        # both carry the same generation number:
+        self.generation = None
+        self.journal_records = 0
+        
+        # Records can only be appended to a journal which was read, or written, in full. Otherwise
+        # they would end up after a stale header or a damaged record, and be lost on the next load:
+        self.journal_valid = False
         
     def set_file_path ( self, file_path : Path ) -> None:
         """
@@ -130,9 +170,16 @@ class Datalog:
         """
         self.file_path = file_path
         
+    def journal_path ( self ) -> str:
+        """
+        Returns:
+            Path of the journal file kept next to the swap file.
+        """
+        return str ( self.file_path ) + ".jnl"
+        
     def load ( self ) -> None:
         """
-        Load last saved state from the swap file.
+        Load last saved state from the swap file, along with any changes recorded in the journal.
         """
         try:
             with open ( self.file_path, 'rb' ) as file:
@@ -140,6 +187,8 @@ class Datalog:
                 
             self.config = info["config"]
             self.tasks = info["tasks"]
+            self.generation = info.get ( "generation", None )
+            self.replay_journal ()
             
             return len(self.config.keys()) > 0
         except Exception:
@@ -147,15 +196,136 @@ class Datalog:
             
         return False
         
+    def replay_journal ( self ) -> None:
+        """
+        Apply the changes recorded in the journal on top of the state loaded from the swap file.
+        
+        Note:
+            A journal left over from an older swap file, or with a damaged header, is ignored.
+            If a record is damaged (e.g. only partially written), it is ignored along with the
+            records following it. Either way, the state loaded from the swap file is kept, and
+            the next checkpoint rewrites the swap file and starts a new journal.
+        """
+        self.journal_records = 0
+        self.journal_valid = False
+        
+        try:
+            file = open ( self.journal_path(), 'rb' )
+        except FileNotFoundError:
+            return
+            
+        with file:
+            size = os.fstat ( file.fileno() ).st_size
+            
+            # Unpickling damaged data can raise almost any exception, not only `pickle.UnpicklingError`:
+            try:
+                if pickle.load ( file ) != self.generation:
+                    return
+            except Exception:
+                logger.warning ( "Ignoring damaged datalog journal." )
+                return
+                
+            while file.tell() < size:
+                try:
+                    kind, key, value = pickle.load ( file )
+                except Exception:
+                    logger.warning ( "Ignoring damaged datalog journal records." )
+                    return
+                    
+                if kind == "task":
+                    self.tasks[ key ] = value
+                else:
+                    self.config = value
+                    
+                self.journal_records += 1
+                
+        self.journal_valid = True
+            
     def save ( self ) -> None:
         """
-        Write the swap file with the most up-to-date processing state.
+        Write the swap file with the most up-to-date processing state and start a new, empty, journal.
+        """
+        with self.lock:
+            generation = ( self.generation or 0 ) + 1
+            temporary_path = str ( self.file_path ) + ".tmp"
+            
+            with open ( temporary_path, 'wb' ) as file:
+                pickle.dump({
+                    "config": self.config,
+                    "tasks": self.tasks,
+                    "generation": generation
+                }, file)
+                
+            os.replace ( temporary_path, self.file_path )
+            
+            with open ( self.journal_path(), 'wb' ) as file:
+                pickle.dump ( generation, file )
+                
+            self.generation = generation
+            self.journal_records = 0
+            self.journal_valid = True
+            self.unsaved_tasks = set()
+            self.unsaved_config = False
+            self.last_save = time.monotonic()
+            
+    def checkpoint ( self ) -> None:
+        """
+        Record the pending changes to the disk, either by appending them to the journal or,
+        if the journal grew too large, by rewriting the whole swap file.
+        """
+        with self.lock:
+            records = len(self.unsaved_tasks) + ( 1 if self.unsaved_config else 0 )
+            
+            if self.generation is None or not self.journal_valid or self.journal_records + records >= self.compact_interval:
+                self.save()
+                return
+                
+            with open ( self.journal_path(), 'ab' ) as file:
+                for task_id in self.unsaved_tasks:
+                    pickle.dump ( ("task", task_id, self.tasks[ task_id ]), file )
+                    
+                if self.unsaved_config:
+                    pickle.dump ( ("config", None, self.config), file )
+                    
+            self.journal_records += records
+            self.unsaved_tasks = set()
+            self.unsaved_config = False
+            self.last_save = time.monotonic()
+            
+    def maybe_flush ( self ) -> None:
+        """
+        Checkpoint pending changes only if enough of them have accumulated, or if the last
+        checkpoint is older than `save_period` seconds.
+        """
+        if not self.unsaved_tasks and not self.unsaved_config:
+            return
+            
+        if len(self.unsaved_tasks) >= self.save_interval or time.monotonic() - self.last_save >= self.save_period:
+            self.checkpoint()
+            
+    def flush ( self ) -> None:
+        """
+        Checkpoint any changes that were not saved yet.
+        """
+        if self.unsaved_tasks or self.unsaved_config:
+            self.checkpoint()
+            
+    def discard ( self ) -> None:
+        """
+        Delete the swap file and its journal, once all work was done and there is nothing left to resume.
+        
+        Any pending changes are dropped, so that a later `flush()` will not write them back.
         """
-        with open ( self.file_path, 'wb' ) as file:
-            pickle.dump({
-                "config": self.config,
-                "tasks": self.tasks
-            }, file)
+        self.unsaved_tasks = set()
+        self.unsaved_config = False
+        self.generation = None
+        self.journal_valid = False
+        
+        for path in [ self.file_path, self.journal_path() ]:
+            try:
+                os.unlink ( path )
+            except FileNotFoundError:
+                pass
             
     def reset ( self ) -> None:
         """
@@ -170,7 +340,12 @@ class Datalog:
         """
         self.tasks = {}
         
-    def initialize_task ( self, measurement : 'obiwan.repository.MeasurementSet', force_restart : bool = False ) -> bool:
+    def initialize_task (
+        self,
+        measurement : 'obiwan.repository.MeasurementSet',
+        force_restart : bool = False,
+        process_start : datetime.datetime = None
+    ) -> bool:
         """
         Initialize a datalog task entry for a given measurement.
         
@@ -179,6 +354,8 @@ class Datalog:
             force_restart (bool): If True, if the measurement is already being tracked or was
                 loaded from the swap file, its state will be reset completely which means
                 it will get reprocessed entirely.
+            process_start (:obj:`datetime.datetime`, optional): Start time to record for the task.
+                Defaults to the current time.
                 
         Returns:
             True if the task was initialized, False otherwise.
@@ -193,10 +370,13 @@ class Datalog:
         self.update_task ( measurement.Id(), (Datalog.Field.FOLDER, self.config.get("folder", None)), save = False )
         self.update_task ( measurement.Id(), (Datalog.Field.MEASUREMENT, measurement), save=False )
         
-        self.update_task ( measurement.Id(), (Datalog.Field.PROCESS_START, datetime.datetime.now()), save=False )
+        if process_start is None:
+            process_start = datetime.datetime.now()
+            
+        self.update_task ( measurement.Id(), (Datalog.Field.PROCESS_START, process_start), save=False )
         self.update_task ( measurement.Id(), (Datalog.Field.RESULT, ""), save=False )
         self.update_task ( measurement.Id(), (Datalog.Field.CONVERTED, False), save=False )
-        self.update_task ( measurement.Id(), (Datalog.Field.UPLOADED, False) )
+        self.update_task ( measurement.Id(), (Datalog.Field.UPLOADED, False), save=False )
         self.update_task ( measurement.Id(), (Datalog.Field.DOWNLOADED, False), save=False )
         
         upload_enabled = not self.config.get(Datalog.Field.CONVERT, False)
@@ -221,6 +401,32 @@ class Datalog:
         self.update_task ( measurement.Id(), (Datalog.Field.SCC_VERSION, ""), save=False )
         
         return True
+        
+    def initialize_tasks ( self, measurements : List['obiwan.repository.MeasurementSet'], force_restart : bool = False ) -> List['obiwan.repository.MeasurementSet']:
+        """
+        Initialize datalog task entries for multiple measurements at once, writing the swap file
+        only once after all of them were initialized.
+        
+        Args:
+            measurements (:obj:`list` of :obj:`obiwan.repository.MeasurementSet`): The lidar measurement sets to track.
+            force_restart (bool): See `initialize_task`.
+            
+        Returns:
+            :obj:`list` of the measurements whose tasks were not initialized, because they
+            were already being tracked.
+        """
+        # All tasks are initialized at the same moment, no need to check the clock for each one:
+        process_start = datetime.datetime.now()
+        
+        with self.lock:
+            skipped = [
+                measurement for measurement in measurements
+                if not self.initialize_task ( measurement, force_restart, process_start )
+            ]
+            
+            self.save()
+            
+        return skipped
 
     def update_config ( self, kvp : Tuple[str, object], save : bool = True ) -> None:
         """
@@ -230,12 +436,14 @@ class Datalog:
         Args:
             kvp (:obj:`Tuple` of :obj:`str` and :obj:`object`): Tuple representing key-value pair to set
                 in the configuration stored inside the datalog.
-            save (bool): If True, the swap file will be immediately written.
+            save (bool): If True, the change will be checkpointed to the swap file with the next batch.
         """
-        self.config[ kvp[0] ] = kvp[1]
-        
-        if save:
-            self.save()
+        with self.lock:
+            self.config[ kvp[0] ] = kvp[1]
+            self.unsaved_config = True
+            
+            if save:
+                self.maybe_flush()
             
     def update_task ( self, task_id : str, kvp : Tuple[str, object], save = True ):
         """
@@ -244,15 +452,34 @@ class Datalog:
         Args:
             kvp (:obj:`Tuple` of :obj:`str` and :obj:`object`): Tuple representing key-value pair to set
                 in the task stored inside the datalog.
-            save (bool): If True, the swap file will be immediately written.
+            save (bool): If True, the change will be checkpointed to the swap file with the next batch.
         """
-        if task_id not in self.tasks.keys():
-            self.tasks[ task_id ] = {}
+        with self.lock:
+            if task_id not in self.tasks.keys():
+                self.tasks[ task_id ] = {}
+                
+            self.tasks[ task_id ][ kvp[0] ] = kvp[1]
+            self.unsaved_tasks.add ( task_id )
             
-        self.tasks[ task_id ][ kvp[0] ] = kvp[1]
+            if save:
+                self.maybe_flush()
+                
+    def update_task_many ( self, task_id : str, kvps : List[Tuple[str, object]], save = True ):
+        """
+        Update multiple fields of a task state in the datalog at once and, optionally, save the
+        datalog to the swap file only after all of them were applied.
         
-        if save:
-            self.save()
+        Args:
+            task_id (str): ID of the task.
+            kvps (:obj:`list` of :obj:`Tuple`): Key-value pairs to set in the task stored inside the datalog.
+            save (bool): If True, the changes will be checkpointed to the swap file with the next batch.
+        """
+        with self.lock:
+            for kvp in kvps:
+                self.update_task ( task_id, kvp, save = False )
+                
+            if save:
+                self.maybe_flush()
                 
     def task ( self, id : str ) -> object:
         """
@@ -1,14 +1,21 @@
-import glob
+import multiprocessing
 import os
+import pickle
 import shutil
+import threading
 
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from enum import Enum
+from itertools import groupby, repeat
+from operator import attrgetter
 from pathlib import Path
 
-from typing import Tuple, List, Dict, Optional, Union
+from typing import Iterator, Tuple, List, Dict, Optional, Union
 
-from obiwan.data import available_raw_file_readers, get_reader_for_type
+from obiwan.data import available_raw_file_readers, get_reader_for_type, SNIFF_LENGTH
 from obiwan.data.types import FileType
 from obiwan.log import logger
 
@@ -46,10 +53,7 @@ class AlignmentType(Enum):
         Returns:
             :obj:`int` between 0 and 59
         """
-        if self == AlignmentType.HALF_HOUR or self == AlignmentType.HALF_HOUR_STRICT:
-            return 30
-        
-        return 0
+        return 30 if self in _HALF_HOUR_ALIGNMENTS else 0
         
     @property
     def is_strict ( self ):
@@ -59,10 +63,12 @@ class AlignmentType(Enum):
         Returns:
             True if this alignment is strict, False otherwise.
         """
-        if self == AlignmentType.SHARP_HOUR_STRICT or self == AlignmentType.HALF_HOUR_STRICT:
-            return True
-            
-        return False
+        return self in _STRICT_ALIGNMENTS
+        
+# Alignment types grouped by the properties they share, so these can be looked up
+# in a single step:
+_HALF_HOUR_ALIGNMENTS = frozenset ( [ AlignmentType.HALF_HOUR, AlignmentType.HALF_HOUR_STRICT ] )
+_STRICT_ALIGNMENTS = frozenset ( [ AlignmentType.SHARP_HOUR_STRICT, AlignmentType.HALF_HOUR_STRICT ] )
     
 class SplitStart(Enum):
     """
@@ -73,6 +79,143 @@ class SplitStart(Enum):
     START = -1
     END = 1
     
+# Origin used to express measurement times as a number of seconds. Measurement times are naive
+# datetimes, so they are not converted to POSIX timestamps which would depend on the local time zone.
+TIME_ORIGIN = datetime ( 1970, 1, 1 )
+ONE_SECOND = timedelta ( seconds = 1 )
+
+# Canonical system keys, shared by all measurement files recorded with the same channels:
+_system_keys = {}
+
+class MeasurementCache:
+    """
+    Persistent cache holding the information read from measurement files, so that unchanged files
+    do not need to be parsed again on every run.
+    
+    Note:
+        Cached information is keyed by the file path and is only considered valid as long as
+        the file modification time and size did not change.
+    
+    Attributes:
+        file_path (:obj:`Path`): Path to the file where the cache is stored.
+        entries (:obj:`dict`): Cached file information, keyed by file path. Each entry is a tuple
+            of modification time (in nanoseconds), size, :obj:`FileType` and :obj:`FileInfo`.
+        dirty (bool): True if the cache was changed since it was loaded or saved.
+    """
+    
+    # Increase this whenever the structure of `FileInfo` or the information the readers
+    # extract changes, in order to discard caches written by older versions:
+    VERSION = 2
+    
+    def __init__ ( self, file_path : Optional[Path] = None ):
+        """
+        Args:
+            file_path (:obj:`Path`, optional): Path to the file where the cache is stored. If specified,
+                the cache is loaded from this file.
+        """
+        self.file_path = file_path
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        
+        if file_path is not None:
+            self.load()
+            
+    def load ( self ) -> None:
+        """
+        Load the cache from the disk. A missing, unreadable or outdated cache file results in an empty cache.
+        """
+        try:
+            with open ( self.file_path, 'rb' ) as file:
+                info = pickle.load ( file )
+                
+            if info.get ( "version", None ) == MeasurementCache.VERSION:
+                self.entries = info["entries"]
+        except Exception:
+            self.entries = {}
+            
+        self.dirty = False
+        
+    def save ( self ) -> None:
+        """
+        Write the cache to the disk if anything changed since it was loaded.
+        """
+        with self.lock:
+            if not self.dirty or self.file_path is None:
+                return
+                
+            temporary_path = str ( self.file_path ) + ".tmp"
+            
+            try:
+                with open ( temporary_path, 'wb' ) as file:
+                    pickle.dump ({
+                        "version": MeasurementCache.VERSION,
+                        "entries": self.entries
+                    }, file)
+                    
+                os.replace ( temporary_path, self.file_path )
+                self.dirty = False
+            except Exception:
+                # Failing to write the cache only means files will be read again next time.
+                logger.warning ( "Could not save measurement files cache to %s", self.file_path )
+                
+    def get ( self, path : Path, stat : os.stat_result ) -> Optional[Tuple[FileType, 'FileInfo']]:
+        """
+        Retrieve the cached information for a file.
+        
+        Args:
+            path (:obj:`Path`): Path to the file.
+            stat (:obj:`os.stat_result`): Current status of the file, used to check the cached information is still valid.
+            
+        Returns:
+            :obj:`tuple` containing the :obj:`FileType` and :obj:`FileInfo` of the file, or None if the file is not cached
+            or it was modified since it was cached.
+        """
+        entry = self.entries.get ( str ( path ), None )
+        
+        if entry is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+            return None
+            
+        return entry[2], entry[3]
+        
+    def set ( self, path : Path, stat : os.stat_result, type : FileType, info : 'FileInfo' ) -> None:
+        """
+        Store the information read from a file.
+        
+        Args:
+            path (:obj:`Path`): Path to the file.
+            stat (:obj:`os.stat_result`): Status of the file at the time it was read.
+            type (:obj:`FileType`): The identified file format.
+            info (:obj:`FileInfo`): Information read from the file.
+        """
+        with self.lock:
+            self.entries[ str ( path ) ] = ( stat.st_mtime_ns, stat.st_size, type, info )
+            self.dirty = True
+            
+    def prune ( self, folder : Path, paths : List[Path] ) -> None:
+        """
+        Drop the cached information of files which were deleted or moved out of a folder, so
+        the cache does not keep growing over time.
+        
+        Args:
+            folder (:obj:`Path`): The folder which was scanned. Files cached from other folders are kept.
+            paths (:obj:`list` of :obj:`Path`): Paths of all the files found in the folder, and its subfolders.
+        """
+        prefix = os.path.join ( os.path.abspath ( folder ), '' )
+        seen = { os.path.abspath ( path ) for path in paths }
+        
+        with self.lock:
+            stale = [
+                path for path in self.entries
+                if os.path.abspath ( path ).startswith ( prefix ) and os.path.abspath ( path ) not in seen
+            ]
+            
+            for path in stale:
+                del self.entries[ path ]
+                
+            if stale:
+                self.dirty = True
+    
 class MeasurementFile:
     """
     Class representing a single lidar data file. This represents an abstraction layer over the various
@@ -82,33 +225,103 @@ class MeasurementFile:
         info (:obj:`FileInfo`): Information that was read from the file. None if file is not a supported file type.
         type (:obj:`FileType`): The identified file format, based on which parses could successfully read it.
         path (:obj:`Path`): The absolute path of this data file.
+        folder (str): The absolute path of the folder holding this data file.
+        filename (str): The name of this data file.
+        start_seconds (int): Start time of the measurement, as a number of seconds since `TIME_ORIGIN`.
+        end_seconds (int): End time of the measurement, as a number of seconds since `TIME_ORIGIN`.
         parser (:obj:`LidarReader`): The parser that read the information from this data file.
     """
-    def __init__ ( self, path : Path ):
+    # A repository can hold a large number of files, so avoid a per-instance dictionary:
+    __slots__ = (
+        'path',
+        'folder',
+        'filename',
+        'type',
+        'info',
+        'parser',
+        'channel_signatures',
+        'system_key',
+        'is_dark',
+        'start_seconds',
+        'end_seconds'
+    )
+    
+    def __init__ ( self, path : Path, cache : Optional[MeasurementCache] = None, stat : Optional[os.stat_result] = None ):
         """
         Read a lidar measurement file.
         
         Note:
             This method will try to automatically identify the format of the file
             by successively calling all the available file parsers until the file is properly read.
+            Parsers which can tell from the first bytes of the file that it is not of their type are skipped.
+            If a cache is provided and it holds up-to-date information about the file, the file
+            will not be read at all.
         
         Args:
             path: Path to the file you want to read.
+            cache: Cache used to look up and store the information read from the file.
+            stat: Status of the file, if already known. Only used together with the cache.
         """
         
         self.path = path
+        
+        # These are used very often when splitting measurements, so compute them only once:
+        absolute_path = os.path.abspath ( path )
+        self.folder = os.path.dirname ( absolute_path )
+        self.filename = os.path.basename ( absolute_path )
+        
         self.type = FileType.UNKNOWN
         self.info = None
         self.parser = None
+        self.channel_signatures = None
+        self.system_key = None
+        self.is_dark = None
+        
+        cached = None
+        if cache is not None:
+            if stat is None:
+                stat = os.stat ( path )
+                
+            cached = cache.get ( path, stat )
+            
+        if cached is not None:
+            self.type, self.info = cached
+            self.parser = get_reader_for_type ( self.type )
+        else:
+            self.Identify()
+            
+            if cache is not None:
+                cache.set ( path, stat, self.type, self.info )
+                
+        # Start and end times are also stored as whole seconds since a fixed origin, so time
+        # differences can be computed with integer arithmetic when splitting measurements:
+        self.start_seconds = ( self.info.start_time - TIME_ORIGIN ) // ONE_SECOND
+        self.end_seconds = ( self.info.end_time - TIME_ORIGIN ) // ONE_SECOND
+        
+    def Identify(self) -> None:
+        """
+        Identify the format of the file and read its information, by successively calling
+        all the available file parsers until the file is properly read.
+        
+        Note:
+            This method raises ValueError if none of the parsers could read the file.
+        """
+        # Read the beginning of the file only once, so the readers can quickly reject
+        # files which are obviously not of their type without fully parsing them:
+        with open ( self.path, 'rb' ) as file:
+            header = file.read ( SNIFF_LENGTH )
         
         for type, reader in available_raw_file_readers().items():
+            if not reader.sniff ( header ):
+                continue
+                
             # Try each available parser in succession. If any parser fails, we know this is not the right
             # file type.
             try:
                 # Save information read from the file, the type of the file format
                 # as well as the parser that succeeded reading the file - in order to not always
                 # search for it.
-                self.info = reader.read_info ( path )
+                self.info = reader.read_info ( self.path )
                 self.type = type
                 self.parser = reader
             
@@ -119,7 +332,7 @@ class MeasurementFile:
         
         if self.type == FileType.UNKNOWN:
             # If no parser could successfully read the file, it means this is an unsupported file type.
-            raise ValueError (f"Could not read file {path}")
+            raise ValueError (f"Could not read file {self.path}")
 
     def IsDark(self, dark_identifiers: List[str] = [ "Dark" ]) -> bool:
         """
@@ -131,10 +344,19 @@ class MeasurementFile:
         Returns:
             True if the file is identified as a dark measurement, False otherwise.
         """
+        # The result is remembered for the identifiers list it was computed with, which is
+        # normally the same list object for every call:
+        if self.is_dark is not None and self.is_dark[0] is dark_identifiers:
+            return self.is_dark[1]
+            
         try:
-            return self.parser.has_identifier_in_list ( self.info, dark_identifiers )
+            is_dark = self.parser.has_identifier_in_list ( self.info, dark_identifiers )
         except Exception:
-            return False
+            is_dark = False
+            
+        self.is_dark = ( dark_identifiers, is_dark )
+        
+        return is_dark
 
     def Path(self) -> Path:
         """
@@ -155,7 +377,7 @@ class MeasurementFile:
         Returns:
             The file name.
         """
-        return os.path.basename(self.path)
+        return self.filename
 
     def StartDateTime(self) -> datetime:
         """
@@ -203,32 +425,40 @@ class MeasurementFile:
         Returns:
             True if both measurement files have the same channels. False otherwise.
         """
-        # Make a copy of the other system's channel list:
-        other_channels = measurement.info.channels[:]
-
-        # Check if both files have the same number of channels:
-        if len(self.info.channels) != len(other_channels):
-            return False
+        return self.SystemKey() is measurement.SystemKey()
+        
+    def ChannelSignatures(self) -> Counter:
+        """
+        Retrieve the signatures of the channels in this measurement file.
+        
+        Note:
+            The signatures are only computed once and then reused, since they are
+            compared many times when splitting measurements.
+        
+        Returns:
+            :obj:`Counter` holding how many times each channel signature appears in this file.
+        """
+        if self.channel_signatures is None:
+            self.channel_signatures = Counter ( channel.signature() for channel in self.info.channels )
             
-        # Check if we can find every channel in both files:
-        for channel in self.info.channels:
-            found = False
-            for other_channel in other_channels:
-                if channel.Equals(other_channel):
-                    found = True
-                    other_channels.remove(other_channel)
-                    break
-
-            if found == False:
-                return False
-
-        # If there's any extra channel that somehow we missed
-        # it means the two files do not contain the exact same
-        # channels.
-        if len(other_channels) > 0:
-            return False
-
-        return True
+        return self.channel_signatures
+        
+    def SystemKey(self) -> frozenset:
+        """
+        Retrieve a key identifying the lidar system configuration (i.e. the set of channels) this file was recorded with.
+        
+        Note:
+            Keys are interned, so files recorded with the same channels share the very same key object
+            and can be compared by identity.
+        
+        Returns:
+            :obj:`frozenset` of (channel signature, count) pairs.
+        """
+        if self.system_key is None:
+            key = frozenset ( self.ChannelSignatures().items() )
+            self.system_key = _system_keys.setdefault ( key, key )
+            
+        return self.system_key
         
     def NumberOfShotsSimilarTo ( self, measurement : 'MeasurementFile', max_relative_diff : Optional[float] = .0 ) -> bool:
         """
@@ -242,31 +472,28 @@ class MeasurementFile:
         Returns:
             True if the channels have the same number of shots, False otherwise.
         """
+        # Look up the other file's channels by signature instead of searching them for every channel.
+        # Going through them in reverse keeps the first channel for duplicate signatures:
+        other_shots = { other_channel.signature(): other_channel.number_of_shots for other_channel in reversed ( measurement.info.channels ) }
+        
         for channel in self.info.channels:
-            same_n_shots = False
+            number_of_shots = channel.number_of_shots
+            other_number_of_shots = other_shots.get ( channel.signature(), None )
             
-            for other_channel in measurement.info.channels:
-                number_of_shots = channel.number_of_shots
-                if type(number_of_shots) is tuple:
-                    number_of_shots = number_of_shots[0]
-                    
-                other_number_of_shots = other_channel.number_of_shots
-                if type(other_number_of_shots) is tuple:
-                    other_number_of_shots = other_number_of_shots[0]
+            if other_number_of_shots is None:
+                same_n_shots = False
+            else:
+                try:
+                    relative_diff = abs((number_of_shots - other_number_of_shots) / other_number_of_shots) * 100.0
+                except ZeroDivisionError:
+                    relative_diff = float('inf')
                     
-                if channel.Equals (other_channel):
-                    try:
-                        relative_diff = abs((number_of_shots - other_number_of_shots) / other_number_of_shots) * 100.0
-                    except ZeroDivisionError:
-                        relative_diff = float('inf')
-                        
-                    same_n_shots = relative_diff <= max_relative_diff
-                    break
+                same_n_shots = relative_diff <= max_relative_diff
                     
             if not same_n_shots:
                 # We found different number of shots for one of the channels.
                 # No need to look further
-                logger.debug (f"{self.Filename()} vs. {measurement.Filename()}: Different number of shots in channel {channel.name} ({channel.number_of_shots} vs {other_channel.number_of_shots})")
+                logger.debug ("%s vs. %s: Different number of shots in channel %s (%s vs %s)", self.Filename(), measurement.Filename(), channel.name, number_of_shots, other_number_of_shots)
                 return False
                 
         # Every channel turned out to have the same number of shots,
@@ -277,6 +504,8 @@ class MeasurementSet:
     """
     Class used to store a continuous lidar measurement. A Measurement contains any number of MeasurementFiles.
     """
+    __slots__ = ( 'dark_files', 'data_files', 'number' )
+    
     def __init__(self, dark : List[MeasurementFile], data : List[MeasurementFile], number : int):
         """
         Construct a Measurement object.
@@ -286,26 +515,20 @@ class MeasurementSet:
             data: List of atmosphere measurement files
             number: Sequence number used to differentiate between measurements taken during the same time.
         """
-        self.dark_files = []
-        self.data_files = []
-        
-        start_times_seen = set()
+        # Make sure we don't accidentally have two files with the same start date.
+        # This would actually mean that file is duplicate, and that will cause problems
+        # with certain converters. Only the first file with a given start date is kept,
+        # and the files keep their original order.
+        dark_by_start = {}
         for dark_file in dark:
-            # Make sure we don't accidentally have two data files
-            # with the same start date. This would actually mean that file is duplicate,
-            # and that will cause problems with certain converters.
-            start_time = dark_file.StartDateTime()
+            dark_by_start.setdefault ( dark_file.StartDateTime(), dark_file )
             
-            if start_time not in start_times_seen and not start_times_seen.add(start_time):
-                self.dark_files.append ( dark_file )
-        
-        start_times_seen = set()
+        data_by_start = {}
         for data_file in data:
-            # Do the same for atmosphere measurement files.
-            start_time = data_file.StartDateTime()
+            data_by_start.setdefault ( data_file.StartDateTime(), data_file )
             
-            if start_time not in start_times_seen and not start_times_seen.add(start_time):
-                self.data_files.append ( data_file )
+        self.dark_files = list ( dark_by_start.values() )
+        self.data_files = list ( data_by_start.values() )
 
         self.number = number
 
@@ -419,6 +642,7 @@ class LidarTest:
     Class to hold information about a lidar test procedure. This is mainly used to compare measurements against it
     in order to verify if they are real or test measurements.
     """
+    __slots__ = ( 'name', 'test_identifiers' )
     
     def __init__ ( self, name : str, test_identifiers : List[str] ):
         """
@@ -469,19 +693,95 @@ class LidarTest:
         if len(test_files) > 0 and not strict:
             return True
             
-        # Check all required types of files are present:
-        for test_type in self.test_identifiers:
-            test_valid = False
-            for file in test_files:
-                if self.MeasurementValid ( file ):
-                    test_valid = True
-                    break
-                    
-            if not test_valid:
-                # Test type was not found. Can stop looking.
-                return False
+        # Check all required types of files are present. Every file is only looked at once,
+        # and we stop as soon as all test types were found:
+        missing = set ( self.test_identifiers )
+        
+        for file in test_files:
+            try:
+                missing = { test_type for test_type in missing if not file.parser.has_identifier ( file.info, test_type ) }
+            except Exception:
+                continue
                 
-        return True
+            if len ( missing ) < 1:
+                return True
+                
+        # Some test type was not found:
+        return len ( missing ) < 1
+
+def _iter_files ( folder : Path ) -> Iterator[os.DirEntry]:
+    """
+    Recursively list all files in a folder and its subdirectories.
+    
+    Note:
+        Files are listed before the subdirectories of their folder are entered, and
+        subdirectories are visited in the order they are listed in, same as `os.walk`.
+        Symbolic links to directories are not followed. Only regular files, or symbolic links to them,
+        are listed, so FIFOs, sockets and broken links are never opened.
+    
+    Args:
+        folder (:obj:`Path`): The folder to scan.
+        
+    Returns:
+        Iterator over :obj:`os.DirEntry` objects of the files found.
+    """
+    folders = [ folder ]
+    
+    while len ( folders ) > 0:
+        subfolders = []
+        
+        try:
+            with os.scandir ( folders.pop() ) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir ( follow_symlinks = False ):
+                            subfolders.append ( entry.path )
+                        elif entry.is_file ():
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError:
+            # Folder was removed or cannot be read. Skip it, like os.walk does.
+            continue
+            
+        folders.extend ( reversed ( subfolders ) )
+
+def _read_measurement_file ( entry : os.DirEntry, cache : Optional[MeasurementCache] = None ) -> Optional[MeasurementFile]:
+    """
+    Try to read a lidar measurement file.
+    
+    Args:
+        entry (:obj:`os.DirEntry`): Directory entry of the file you want to read.
+        cache (:obj:`MeasurementCache`, optional): Cache used to avoid reading unchanged files again.
+        
+    Returns:
+        :obj:`MeasurementFile` if the file could be read, None otherwise.
+    """
+    try:
+        stat = entry.stat() if cache is not None else None
+        
+        return MeasurementFile ( path = entry.path, cache = cache, stat = stat )
+    except Exception:
+        return None
+
+def _read_measurement_info ( path : Path ) -> Optional[Tuple[FileType, 'FileInfo']]:
+    """
+    Try to read the information from a lidar measurement file. This is meant to be run in a separate process,
+    so it only returns data which can be cheaply sent back to the parent process.
+    
+    Args:
+        path (:obj:`Path`): Path to the file you want to read.
+        
+    Returns:
+        :obj:`tuple` containing the :obj:`FileType` of the file and the :obj:`FileInfo` read from it,
+        or None if the file could not be read.
+    """
+    try:
+        file = MeasurementFile ( path = path )
+        
+        return file.type, file.info
+    except Exception:
+        return None
 
 class Lidarchive:
     """
@@ -511,6 +811,8 @@ class Lidarchive:
             used to filter dark measurement files from other types.
         measurement_identifiers (:obj:`list` of :obj:`str`): List of dark identifiers, as strings,
             used to filter atmosphere measurement files from other types.
+        cache (:obj:`MeasurementCache`): Cache of information read from measurement files during previous scans.
+            None if caching is disabled.
     """
 
     def __init__(
@@ -518,7 +820,8 @@ class Lidarchive:
         folder : Optional[Path] = None,
         tests : List[LidarTest] = [],
         dark_identifiers = List[str],
-        measurement_identifiers = List[str]
+        measurement_identifiers = List[str],
+        cache_path : Optional[Path] = None
     ):
         """
         Args:
@@ -529,6 +832,8 @@ class Lidarchive:
                 used to filter dark measurement files from other types.
             measurement_identifiers (:obj:`list` of :obj:`str`): List of dark identifiers, as strings,
                 used to filter atmosphere measurement files from other types.
+            cache_path (Path, optional): Path to the file where information read from measurement files is cached
+                between runs. If not specified, every file will be read on each scan.
         """
         
         self.SetFolder ( folder )
@@ -536,6 +841,7 @@ class Lidarchive:
         self.tests = tests
         self.dark_identifiers = dark_identifiers
         self.measurement_identifiers = measurement_identifiers
+        self.cache = MeasurementCache ( cache_path ) if cache_path is not None else None
 
     def SetFolder(self, folder : Path) -> None:
         """
@@ -564,6 +870,28 @@ class Lidarchive:
         self.accepted_max_length = 0
         self.accepted_alignment_type = AlignmentType.NONE
         self.continuous_measurements = []
+        self.first_data_index = None
+        self.partitioned_measurements = None
+        self.segments = {}
+        
+    def FirstDataIndex (self) -> int:
+        """
+        Retrieve the index of the first measurement file which is not a dark measurement.
+        
+        Note:
+            The index is cached, and only computed again if measurement files were added or removed.
+        
+        Returns:
+            Index in the measurement files list. If there are only dark measurements, the number of
+            measurement files is returned.
+        """
+        count = len ( self.measurements )
+        
+        if self.first_data_index is None or self.first_data_index[0] != count:
+            index = next ( ( index for index, measurement in enumerate ( self.measurements ) if not measurement.IsDark ( self.dark_identifiers ) ), count )
+            self.first_data_index = ( count, index )
+            
+        return self.first_data_index[1]
 
     def MeasurementWasSent(self, last_end, min_length, max_length):
         """
@@ -589,14 +917,9 @@ class Lidarchive:
             Updated variable of the last set of measurements sent
         """
 
-        index = 0
-        for measurement in self.measurements:
-            if measurement.IsDark( self.dark_identifiers ):
-                index += 1
         #ignore dark files
-
         current_end = self.measurements[-1].EndDateTime()
-        current_start = self.measurements[index].StartDateTime()
+        current_length = self.measurements[-1].end_seconds - self.measurements[self.FirstDataIndex()].start_seconds
 
 
         if str(current_end) == last_end:
@@ -604,7 +927,7 @@ class Lidarchive:
 
         last_end = current_end
 
-        if (current_end - current_start).total_seconds() >= max_length + min_length:
+        if current_length >= max_length + min_length:
             return (True, last_end)
 
         return (False, last_end)
@@ -650,71 +973,58 @@ class Lidarchive:
         folder_split_measurements = []
         
         if same_folder:
-            # First split measurement sets by folder if required
-            measurements_by_folder = {}
+            # First split measurement sets by folder if required. The sort is stable,
+            # so files keep their order inside each folder.
+            measurements_by_folder = sorted ( measurements, key = attrgetter ( 'folder' ) )
             
-            for measurement in measurements:
-                folder = os.path.abspath ( os.path.dirname ( measurement.Path() ) )
-                
-                if folder not in measurements_by_folder.keys():
-                    measurements_by_folder[ folder ] = []
-                    
-                measurements_by_folder[ folder ].append ( measurement )
-                
-            for folder_data in measurements_by_folder.values():
-                folder_split_measurements.append ( folder_data )
+            for folder, folder_data in groupby ( measurements_by_folder, key = attrgetter ( 'folder' ) ):
+                folder_split_measurements.append ( list ( folder_data ) )
         else:
             folder_split_measurements = [ measurements ]
         
         if same_type:
             # Split measurement sets by file type if required
             for split in folder_split_measurements:
-                test = set( [os.path.dirname(m.Path()) for m in split] )
+                measurements_by_type = defaultdict ( list )
                 
-                measurements_by_type = {}
-                
-                for type in FileType:
-                    measurements_by_type[ type ] = []
-                    
                 for measurement in split:
                     measurements_by_type[ measurement.Type() ].append ( measurement )
                     
-                for type in measurements_by_type.keys():
-                    split_measurements.append ( measurements_by_type[type] )
-            else:
-                split_measurements = folder_split_measurements
-
+                split_measurements.extend ( measurements_by_type.values() )
+        else:
+            split_measurements = folder_split_measurements
+
+        # Decide only once which properties must stay the same inside a set, instead of checking
+        # the flags for every file. Files recorded with the same channels share the same system key
+        # object, so comparing the keys is cheap.
+        if same_location and same_system:
+            split_key = lambda measurement: ( measurement.Site(), measurement.SystemKey() )
+        elif same_location:
+            split_key = lambda measurement: ( measurement.Site(), )
+        elif same_system:
+            split_key = lambda measurement: ( measurement.SystemKey(), )
+        else:
+            split_key = lambda measurement: ()
+            
         for split in split_measurements:
             if len(split) < 1:
                 # We have no measurement in this split
                 continue
                 
             cset = [split[0]]
-            last_measurement = split[0]
+            last_key = split_key ( split[0] )
             
-            # Split by gap, location and system if requested:
+            # Split by gap, location and system if requested. Since a set is split as soon as
+            # the location or system changes, comparing to the previous file is enough:
             for measurement_index in range(1, len(split)):
-                previous_end = split[measurement_index - 1].EndDateTime()
-                current_start = split[measurement_index].StartDateTime()
-
-                gap_trigger = (current_start - previous_end).total_seconds() > max_gap
-                system_trigger = False
+                key = split_key ( split[measurement_index] )
                 
-                if same_system:
-                    system_trigger = split[measurement_index].HasSameChannelsAs(last_measurement) == False
-
-                location_trigger = False
-                if same_location:
-                    if split[measurement_index - 1].Site() != split[measurement_index].Site():
-                        location_trigger = True
-
-                if gap_trigger or location_trigger or system_trigger:
+                if split[measurement_index].start_seconds - split[measurement_index - 1].end_seconds > max_gap or key != last_key:
                     distinct_sets.append(cset)
-
                     cset = []
-                    last_measurement = split[measurement_index]
 
                 cset.append(split[measurement_index])
+                last_key = key
 
             if len(cset) > 0:
                 distinct_sets.append(cset)
@@ -759,95 +1069,79 @@ class Lidarchive:
             return Lidarchive.SplitByLength ( measurements = measurements, min_length = min_length, max_length = max_length )
         
         start_index = 0
-        last_time_difference = 60
         minute_marker = alignment_type.minute
         
-        # First data file marks the beginning of a set.
-        # If doesn't satisfy any criteria it will be filtered out later.
+        # Alignment periods are one hour long and start at the minute marker. Each measurement
+        # is assigned the number of the period it starts in, counting from `TIME_ORIGIN`:
+        period_offset = minute_marker * 60
+        period_length = 3600
+        
+        starts = [ measurement.start_seconds for measurement in measurements ]
+        ends = [ measurement.end_seconds for measurement in measurements ]
+        first_period = ( starts[0] - period_offset ) // period_length
+        last_period = ( starts[-1] - period_offset ) // period_length
+        
+        # Split measurement sets whenever we pass the minute marker, which is
+        # whenever a measurement starts in a different period than the previous one.
+        # Since the measurements are sorted, the first measurement of each period is
+        # found with a binary search. Periods without any measurements are skipped.
+        # Any data before the first split is handled separately, later on.
         split_indexes = []
-        splits = []
         
-        # Go through every measurement and store every local minimum
-        # in time difference compared to the minute marker:
-        for index, measurement in enumerate ( measurements ):
-            start_minute = measurement.StartDateTime().minute
-            
-            # Look both ahead and behind in time for the closest minute marker:
-            time_difference = minute_marker - start_minute
-            
-            # Split measurement sets whenever we pass the minute marker:
-            should_split = time_difference <= 0 and last_time_difference > 0
+        for period in range ( first_period + 1, last_period + 1 ):
+            index = bisect_left ( starts, period * period_length + period_offset, split_indexes[-1] if split_indexes else 1 )
             
-            if should_split:
-                # Time difference to the required minute mark has started
-                # rising, so we store the index where to perform the split
-                # and reset the time difference.
-                last_time_difference = -99
-                split_indexes.append (index)
-            else:
-                # We are getting closer to the required minute mark
-                # but we still need to check further measurements
-                last_time_difference = time_difference
-                
+            if not split_indexes or index != split_indexes[-1]:
+                split_indexes.append ( index )
+        
         # Did we actually do any alignment split?
         # If not, we should just copy the data as it is
         # without splitting it.
         if len(split_indexes) < 1:
             return Lidarchive.SplitByLength ( measurements = measurements, min_length = min_length, max_length = max_length )
             
-        # We do have some splits to perform:
-        for i in range ( 0, len (split_indexes) - 1 ):
-            # Copy measurements from each split index, right before the following split index.
-            start_index = split_indexes[i]
-            end_index = split_indexes[i+1]
-            
-            splits.append(measurements[ start_index : end_index ])
-            
         segments = []
-        # Split measurements by length:
-        for split in splits:
-            segments.extend ( Lidarchive.SplitByLength ( measurements = split, min_length = min_length, max_length = max_length ) )
-            
-        # Check if we have data before the first split:
-        if split_indexes[0] != 0:
-            # Compute the time length of the data before the first split
-            leading_data = measurements[ : split_indexes[0] ]
+        
+        # We do have some splits to perform. Each one covers the measurements from a split index
+        # to right before the following split index, and is split by length in place:
+        for start_index, end_index in zip ( split_indexes, split_indexes[1:] ):
+            segments.extend ( Lidarchive._SplitByLengthRange ( measurements, starts, ends, start_index, end_index, min_length = min_length, max_length = max_length ) )
             
-            if len(leading_data):
-                leading_length = (leading_data[-1].EndDateTime() - leading_data[0].StartDateTime()).total_seconds()
-                
-                if leading_length < min_length:
-                    # If the data before the first split is too short to be a standalone measurement
-                    # we can glue it to the first segment:
-                    if not alignment_type.is_strict:
-                        # Glue the data to the first split if we are not in a strict mode:
-                        if len (segments) > 0:
-                            segments[0] = leading_data + segments[0]
-                        else:
-                            segments = Lidarchive.SplitByLength ( measurements = leading_data, min_length = min_length, max_length = max_length )
-                        
-                    # If we are in a strict mode we simply discard the data.
+        # The data before the first split and after the last one are handled on their own. Their
+        # lengths are read from the start and end times computed above, and the measurements are
+        # only copied out of the list when they are actually kept:
+        first_split = split_indexes[0]
+        last_split = split_indexes[-1]
+        
+        # Compute the time length of the data before the first split:
+        leading_length = ends[first_split - 1] - starts[0]
+        
+        if leading_length < min_length:
+            # If the data before the first split is too short to be a standalone measurement
+            # we can glue it to the first segment:
+            if not alignment_type.is_strict:
+                # Glue the data to the first split if we are not in a strict mode:
+                if len (segments) > 0:
+                    segments[0] = measurements[ : first_split ] + segments[0]
                 else:
-                    # If data before the first split is long enough, we treat it as a standalone measurement:
-                    segments = Lidarchive.SplitByLength ( measurements = leading_data, min_length = min_length, max_length = max_length, allow_glue = not alignment_type.is_strict ) + segments
+                    segments = Lidarchive._SplitByLengthRange ( measurements, starts, ends, 0, first_split, min_length = min_length, max_length = max_length )
+                
+            # If we are in a strict mode we simply discard the data.
+        else:
+            # If data before the first split is long enough, we treat it as a standalone measurement:
+            segments = Lidarchive._SplitByLengthRange ( measurements, starts, ends, 0, first_split, min_length = min_length, max_length = max_length, allow_glue = not alignment_type.is_strict ) + segments
                 
         # Finally, do the same thing for trailing data:
-        trailing_data = measurements [ split_indexes[-1] : ]
+        trailing_length = ends[-1] - starts[last_split]
         
-        if len (trailing_data):
-            trailing_length = (trailing_data[-1].EndDateTime() - trailing_data[0].StartDateTime()).total_seconds()
-            
-            if trailing_length < min_length:
-                if not alignment_type.is_strict:
-                    if len(segments) > 0:
-                        segments[-1].extend(trailing_data)
-                    else:
-                        segments = Lidarchive.SplitByLength ( measurements = trailing_data, min_length = min_length, max_length = max_length )
-            else:
-                segments.extend( Lidarchive.SplitByLength ( measurements = trailing_data, min_length = min_length, max_length = max_length, start = SplitStart.END, allow_glue = not alignment_type.is_strict ) )
-                
-            for index, set in enumerate (segments):
-                set_length = (set[-1].EndDateTime() - set[0].StartDateTime()).total_seconds()
+        if trailing_length < min_length:
+            if not alignment_type.is_strict:
+                if len(segments) > 0:
+                    segments[-1].extend ( measurements[ last_split : ] )
+                else:
+                    segments = Lidarchive._SplitByLengthRange ( measurements, starts, ends, last_split, len(measurements), min_length = min_length, max_length = max_length )
+        else:
+            segments.extend ( Lidarchive._SplitByLengthRange ( measurements, starts, ends, last_split, len(measurements), min_length = min_length, max_length = max_length, allow_glue = not alignment_type.is_strict ) )
                 
         return segments
 
@@ -875,45 +1169,73 @@ class Lidarchive:
         if len(measurements) < 1:
             return []
 
-        last_end = measurements[-1].EndDateTime()
-        segment_start = measurements[0].StartDateTime()
+        starts = [ measurement.start_seconds for measurement in measurements ]
+        ends = [ measurement.end_seconds for measurement in measurements ]
+        
+        return Lidarchive._SplitByLengthRange ( measurements, starts, ends, 0, len(measurements), min_length = min_length, max_length = max_length, allow_glue = allow_glue )
+        
+    @staticmethod
+    def _SplitByLengthRange(
+        measurements : List[MeasurementFile],
+        starts : List[int],
+        ends : List[int],
+        first_index : int,
+        end_index : int,
+        min_length : int,
+        max_length : int,
+        allow_glue: bool = True
+    ) -> List[List[MeasurementFile]]:
+        """
+        Split the measurement files in `measurements[first_index:end_index]` by length,
+        without copying the range out of the list first.
+
+        Args:
+            measurements (:obj:`list` of :obj:`Measurement`): A list of measurements
+            starts (:obj:`list` of int): Start time, in seconds, of each measurement in `measurements`
+            ends (:obj:`list` of int): End time, in seconds, of each measurement in `measurements`
+            first_index (int): Index of the first measurement in the range
+            end_index (int): Index right after the last measurement in the range
+            min_length (int): Minimum accepted length, measured in seconds, of a set of measurements
+            max_length (int): Maximum accepted length, measured in seconds, of a set of measurements
+            allow_glue (bool, optional): Whether a short tail can be glued to the last segment
+
+        Returns:
+            :obj:`list` :obj:`list` of :obj:`MeasurementFile` after being split on the specified criteria.
+        """
+        if end_index <= first_index:
+            return []
+            
+        last_end = ends[end_index - 1]
         segments = []
-        segment = [measurements[0]]
         
-        if start == SplitStart.END:
-            index_generator = reversed ( range(0, len(measurements)-1) )
-        else:
-            index_generator = range(1, len(measurements))
+        # Only the index where each segment starts is tracked while looking for the split points.
+        # The measurement lists are built by slicing once a segment is complete.
+        segment_index = first_index
+        segment_start = starts[first_index]
 
-        for index in range(1, len(measurements)):
-            current_start = measurements[index].StartDateTime()
-            current_end = measurements[index].EndDateTime()
+        for index in range(first_index + 1, end_index):
+            current_start = starts[index]
 
-            if (last_end - current_start).total_seconds() < min_length and (last_end - segment_start).total_seconds() > min_length and allow_glue:
-                segment.extend(measurements[index:])
-                segments.append(segment)
+            if allow_glue and last_end - current_start < min_length and last_end - segment_start > min_length:
+                segments.append(measurements[segment_index:end_index])
                 
-                # We must reset the segment variable, otherwise
+                # We must mark the segment as done, otherwise
                 # we will have residual values which will duplicate
                 # real data files.
-                segment = []
+                segment_index = end_index
                 break
 
-            if (current_end - segment_start).total_seconds() > max_length:
-                segments.append(segment)
-                segment = [measurements[index]]
-                segment_start = measurements[index].StartDateTime()
-                continue
-            
-            segment.append(measurements[index])
+            if ends[index] - segment_start > max_length:
+                segments.append(measurements[segment_index:index])
+                segment_index = index
+                segment_start = current_start
             
         # We might have a residual open segment.
         # Check if it satisfies the length criteria before adding it
         # to the final array.
-        if len(segment) > 0:
-            segment_length = (segment[-1].EndDateTime() - segment[0].StartDateTime()).total_seconds()
-            if segment_length > min_length:
-                segments.append(segment)
+        if segment_index < end_index:
+            if last_end - starts[segment_index] > min_length:
+                segments.append(measurements[segment_index:end_index])
 
         return segments
         
@@ -953,14 +1275,7 @@ class Lidarchive:
                     potential_tests[ test.name ] = []
                     
                     if test.CheckTest ( test_files, strict ):
-                        subfolder_name = test_files[0].StartDateTime().strftime(date_format)
-                        test_subfolder = os.path.join ( out_folder, test_name, subfolder_name )
-                        
-                        if not os.path.isdir ( test_subfolder ):
-                            os.makedirs ( test_subfolder )
-                        
-                        for file in test_files:
-                            shutil.copy2(file.Path(), test_subfolder)
+                        Lidarchive._CopyTest ( test, test_files, out_folder, date_format )
                             
         # Do a final check on remaining data:
         for test in self.tests:
@@ -968,14 +1283,50 @@ class Lidarchive:
             potential_tests[ test.name ] = []
             
             if test.CheckTest ( test_files, strict ):
-                subfolder_name = test_files[0].StartDateTime().strftime(date_format)
-                test_subfolder = os.path.join ( out_folder, test_name, subfolder_name )
+                Lidarchive._CopyTest ( test, test_files, out_folder, date_format )
                 
-                if not os.path.isdir ( test_subfolder ):
-                    os.makedirs ( test_subfolder )
+        return True
+        
+    @staticmethod
+    def _CopyTest (
+        test : LidarTest,
+        test_files : List[MeasurementFile],
+        out_folder : Path,
+        date_format : str
+    ) -> None:
+        """
+        Copy the files of a single test inside its own subfolder.
+        
+        Note:
+            Raw files are never modified once written, so they are hard linked whenever possible,
+            which avoids copying the data altogether. If linking fails (e.g. the output folder is on
+            another file system, or a file from a previous run is already there), the file is copied.
+
+        Args:
+            test (:obj:`LidarTest`): The test the files belong to.
+            test_files (:obj:`list` of :obj:`MeasurementFile`): The files of the test.
+            out_folder (:obj:`Path`): Path to the folder holding the subfolders of all the tests.
+            date_format (str): Date format used to name the subfolder of the test.
+        """
+        subfolder_name = test_files[0].StartDateTime().strftime(date_format)
+        test_subfolder = os.path.join ( out_folder, test.name, subfolder_name )
+        
+        os.makedirs ( test_subfolder, exist_ok = True )
+        
+        for file in test_files:
+            destination = os.path.join ( test_subfolder, file.Filename() )
+            
+            try:
+                os.link ( file.Path(), destination )
+                continue
+            except OSError:
+                pass
                 
-                for file in test_files:
-                    shutil.copy2(file.Path(), test_subfolder)
+            try:
+                shutil.copy2 ( file.Path(), destination )
+            except shutil.SameFileError:
+                # Already linked by a previous run.
+                pass
 
 
     def ContinuousMeasurements(
@@ -1000,23 +1351,46 @@ class Lidarchive:
         Returns:
             :obj:`list` of :obj:`MeasurementSet`
         """
-        if len(self.continuous_measurements) == 0:
-            self.ComputeContinuousMeasurements(max_gap, min_length, max_length, min_dark_length, alignment_type)
-
-        if self.accepted_gap != max_gap:
-            self.ComputeContinuousMeasurements(max_gap, min_length, max_length, min_dark_length, alignment_type)
-
-        if self.accepted_min_length != min_length:
-            self.ComputeContinuousMeasurements(max_gap, min_length, max_length, min_dark_length, alignment_type)
-
-        if self.accepted_max_length != max_length:
-            self.ComputeContinuousMeasurements(max_gap, min_length, max_length, min_dark_length, alignment_type)
-
-        if self.accepted_alignment_type != alignment_type:
+        # Only compute the measurement sets again if nothing is cached or any of the parameters changed:
+        parameters = ( max_gap, min_length, max_length, alignment_type )
+        accepted_parameters = ( self.accepted_gap, self.accepted_min_length, self.accepted_max_length, self.accepted_alignment_type )
+        
+        if len(self.continuous_measurements) == 0 or parameters != accepted_parameters:
             self.ComputeContinuousMeasurements(max_gap, min_length, max_length, min_dark_length, alignment_type)
 
         return self.continuous_measurements
         
+    def PartitionMeasurements(self) -> Tuple[List[MeasurementFile], List[MeasurementFile]]:
+        """
+        Separate the dark measurement files from the atmosphere measurement files.
+        
+        Note:
+            Both lists are built in a single pass over the measurement files, and they are cached
+            until measurement files are added or removed.
+        
+        Returns:
+            :obj:`tuple` containing the :obj:`list` of dark measurement files and the :obj:`list` of atmosphere
+            measurement files. Files which are neither are left out.
+        """
+        count = len ( self.measurements )
+        
+        if self.partitioned_measurements is None or self.partitioned_measurements[0] != count:
+            dark_identifiers = self.dark_identifiers
+            measurement_identifiers = self.measurement_identifiers
+            
+            dark_measurements = []
+            data_measurements = []
+            
+            for measurement in self.measurements:
+                if measurement.IsDark ( dark_identifiers ):
+                    dark_measurements.append ( measurement )
+                elif measurement.Site() in measurement_identifiers:
+                    data_measurements.append ( measurement )
+                    
+            self.partitioned_measurements = ( count, dark_measurements, data_measurements )
+            
+        return self.partitioned_measurements[1], self.partitioned_measurements[2]
+        
     def ContinuousDarkMeasurements(self, max_gap : int, min_length : int, max_length : int, alignment_type : AlignmentType) -> List[List[MeasurementFile]]:
         """
         Retrieve continuous sets of dark measurements.
@@ -1031,7 +1405,7 @@ class Lidarchive:
         Returns:
             :obj:`list` of :obj:`list` of :obj:`MeasurementFile`
         """
-        dark_measurements = [ m for m in self.measurements if m.IsDark ( self.dark_identifiers ) ]
+        dark_measurements, _ = self.PartitionMeasurements()
         
         dark_segments = self.SplitMeasurements ( dark_measurements, max_gap, min_length = min_length, max_length = max_length, alignment_type = alignment_type, same_location = True, same_type = True, same_system = True )
         
@@ -1047,12 +1421,56 @@ class Lidarchive:
         Returns:
             :obj:`list` of :obj:`list` of :obj:`MeasurementFile`
         """
-        data_measurements = [ m for m in self.measurements if not m.IsDark ( self.dark_identifiers ) and m.Site() in self.measurement_identifiers ]
+        _, data_measurements = self.PartitionMeasurements()
         
         data_segments = self.SplitMeasurements ( data_measurements, max_gap, min_length, max_length, alignment_type, same_location = True, same_type = True, same_system = True )
         
         return data_segments
         
+    def Segments (
+        self,
+        max_gap : int,
+        min_length : int,
+        max_length : int,
+        min_dark_length : int,
+        alignment_type : AlignmentType
+    ) -> Tuple[List[List[MeasurementFile]], List[List[MeasurementFile]]]:
+        """
+        Retrieve the continuous sets of dark and atmosphere measurements.
+        
+        Note:
+            The sets are cached for every combination of parameters they were requested with, until
+            measurement files are added or removed, so trying out several alignment types or lengths
+            on the same measurement files only splits them once per combination.
+        
+        Args:
+            max_gap (int): Maximum acceptable time gap between two measurement files in seconds.
+            min_length (int): Minimum acceptable length for a measurement in seconds.
+            max_length (int): Maximum acceptable length for a measurement in seconds. Measurements longer
+                than this value will be split.
+            min_dark_length (int): Minimum acceptable length for a dark measurement in seconds.
+            alignment_type (:obj:`AlignmentType`): The type of alignment to be performed on the measurement sets.
+            
+        Returns:
+            :obj:`tuple` containing the :obj:`list` of dark measurement sets and the :obj:`list` of atmosphere
+            measurement sets, sorted by start date, each set being a :obj:`list` of :obj:`MeasurementFile`.
+        """
+        key = ( len ( self.measurements ), max_gap, min_length, max_length, min_dark_length, alignment_type )
+        
+        if key not in self.segments:
+            data_segments = self.ContinuousDataMeasurements ( max_gap, min_length, max_length, alignment_type )
+            
+            # Segments from different folders or file types are split separately, so they have to be
+            # sorted by start date. This is only done once, when the segments are cached:
+            data_segments.sort ( key = lambda segment: segment[0].start_seconds )
+            
+            self.segments[key] = (
+                self.ContinuousDarkMeasurements ( max_gap, min_dark_length, max_length, alignment_type ),
+                data_segments
+            )
+            
+        return self.segments[key]
+        
     @staticmethod
     def ClosestDarkSegment (
         data_segment : List[MeasurementFile],
@@ -1070,50 +1488,73 @@ class Lidarchive:
         Returns:
             :obj:`list` of :obj:`MeasurementFile`
         """
-        data_start = data_segment[0].StartDateTime()
-        data_end = data_segment[0].EndDateTime()
+        return Lidarchive._ClosestDarkSegment ( data_segment, Lidarchive._SegmentSummaries ( dark_segments ), type )
+        
+    @staticmethod
+    def _SegmentSummaries (
+        segments : List[List[MeasurementFile]]
+    ) -> List[Tuple[FileType, frozenset, int, int, List[MeasurementFile]]]:
+        """
+        Collect what is needed to compare each measurement set with others, so it is only looked up once
+        per set, no matter how many times the set is compared.
+        
+        Args:
+            segments (:obj:`list` of :obj:`list` of :obj:`MeasurementFile`): List of measurement sets.
+            
+        Returns:
+            :obj:`list` of :obj:`tuple` holding the file type, system key, start and end time (in seconds)
+            of each measurement set, followed by the set itself.
+        """
+        return [ ( segment[0].Type(), segment[0].SystemKey(), segment[0].start_seconds, segment[-1].end_seconds, segment ) for segment in segments ]
+        
+    @staticmethod
+    def _ClosestDarkSegment (
+        data_segment : List[MeasurementFile],
+        dark_summaries : List[Tuple[FileType, frozenset, int, int, List[MeasurementFile]]],
+        type : FileType = None
+    ) -> List[MeasurementFile]:
+        """
+        Find the closest dark measurement set to a given atmosphere measurement set.
+        
+        Args:
+            data_segment (:obj:`list` of :obj:`MeasurementFile`): Atmosphere measurement set as a list of :obj:`MeasurementFile`
+            dark_summaries (:obj:`list` of :obj:`tuple`): Dark measurement sets to search in, as returned by `_SegmentSummaries`.
+            type (:obj:`FileType`, optional): Required file format. If not specified, any file format will be considered valid.
+            
+        Returns:
+            :obj:`list` of :obj:`MeasurementFile`
+        """
+        data_start = data_segment[0].start_seconds
+        data_end = data_segment[-1].end_seconds
+        system_key = data_segment[0].SystemKey()
         
         closest = None
-        best_dark_segment = None
+        best_dark_segment = []
         
-        for index, dark_segment in enumerate(dark_segments):
-            if dark_segment[0].Type() != type and type is not None:
+        for dark_type, dark_system_key, dark_start, dark_end, dark_segment in dark_summaries:
+            if dark_type != type and type is not None:
                 # This is not the type of data we are looking for.
                 continue
                 
-            if not dark_segment[0].HasSameChannelsAs ( data_segment[0] ):
+            if dark_system_key is not system_key:
                 # This dark file does not correspond to this data segment
                 continue
                 
-            dark_start = data_segment[0].StartDateTime()
-            dark_end = data_end = data_segment[0].EndDateTime()
-            
-            if dark_end < data_start:
-                # Dark measurements were taken before data measurements.
-                time_gap = data_start - dark_end
-            elif dark_start > data_end:
-                # Dark measurements were taken after data measurements.
-                time_gap = dark_start - data_end
-            else:
-                # Dark measurements and data measurements overlap so set
-                # the time gap to zero.
-                #
-                # We can also safely assume no other dark segment will come
+            # If dark measurements were taken before data measurements, only the first term is positive.
+            # If they were taken after data measurements, only the second one is. If they overlap,
+            # neither is and the time gap is zero.
+            time_gap = max ( data_start - dark_end, dark_start - data_end, 0 )
+            
+            if time_gap == 0:
+                # We can safely assume no other dark segment will come
                 # close to this performance. :P
-                time_gap = timedelta(seconds=0)
                 return dark_segment
                 
-            if closest is None:
-                closest = time_gap
-                best_dark_segment = index
-            elif time_gap < closest:
+            if closest is None or time_gap < closest:
                 closest = time_gap
-                best_dark_segment = index
+                best_dark_segment = dark_segment
                 
-        if best_dark_segment is None:
-            return []
-            
-        return dark_segments[index]
+        return best_dark_segment
 
     def ComputeContinuousMeasurements(
         self,
@@ -1143,35 +1584,41 @@ class Lidarchive:
             self.accepted_alignment_type = alignment_type
             return
             
-        gapped_dark_segments = self.ContinuousDarkMeasurements ( max_gap, min_dark_length, max_length, alignment_type )
-        gapped_data_segments = self.ContinuousDataMeasurements ( max_gap, min_length, max_length, alignment_type )
+        gapped_dark_segments, gapped_data_segments = self.Segments ( max_gap, min_length, max_length, min_dark_length, alignment_type )
+        
+        # Every dark segment is compared with every data segment, so what is needed for the
+        # comparison is only looked up once:
+        dark_summaries = Lidarchive._SegmentSummaries ( gapped_dark_segments )
 
         measurement_number = 0
-        last_start = None
+        last_day = None
         
-        # Sort the segments by start date because we will compare
-        # the dates in order to set the sequence number.
-        gapped_data_segments.sort ( key=lambda x: x[0].StartDateTime() )
-                
+        # Segments ending after this time are too recent: new data files might still appear for them.
+        # The current time is only read once for all segments:
+        latest_end = ( datetime.now() - TIME_ORIGIN ) / ONE_SECOND - max_gap
+        
+        # The data segments are sorted by start date, which we rely on
+        # when comparing the dates in order to set the sequence number.
         for segment in gapped_data_segments:
             # This is already filtered
             real_measurements = segment
             # Need to find closest continuous dark segment:
-            dark_measurements = Lidarchive.ClosestDarkSegment(data_segment = segment, dark_segments = gapped_dark_segments, type = real_measurements[0].Type())
+            dark_measurements = Lidarchive._ClosestDarkSegment ( data_segment = segment, dark_summaries = dark_summaries, type = real_measurements[0].Type() )
 
-            # Apply measurement number if necessary:
-            if last_start != None:
-                if segment[0].StartDateTime().date() != last_start.date():
-                    measurement_number = 0
-                else:
-                    measurement_number += 1
-            else:
+            # Apply measurement number if necessary. `TIME_ORIGIN` is at midnight, so
+            # whole days since the origin change exactly when the date changes:
+            # The first segment never has the same day as `last_day`, so it always starts from 0.
+            day = segment[0].start_seconds // 86400
+            
+            if day != last_day:
                 measurement_number = 0
+            else:
+                measurement_number += 1
 
-            last_start = segment[0].StartDateTime()
+            last_day = day
 
             # Do not add last segment if new data files might appear just in case it's a recent dataset:
-            if (datetime.now() - segment[-1].EndDateTime()).total_seconds() >= max_gap:
+            if segment[-1].end_seconds <= latest_end:
                 measurement_set = MeasurementSet(
                     dark=dark_measurements,
                     data=real_measurements,
@@ -1194,7 +1641,13 @@ class Lidarchive:
         """
         return self.measurements
 
-    def ReadFolder(self, start_date : Optional[datetime] = None, end_date : Optional[datetime] = None) -> None:
+    def ReadFolder(
+        self,
+        start_date : Optional[datetime] = None,
+        end_date : Optional[datetime] = None,
+        workers : int = 1,
+        processes : bool = False
+    ) -> None:
         """
         Read the folder and identify all lidar data files in the folder and its subdirectories.
 
@@ -1203,42 +1656,82 @@ class Lidarchive:
             If set to None, this criteria will not be used.
         end_date (:obj:`datetime`, optional): The earliest date a measurement could have been taken at.
             If set to None, this criteria will not be used.
+        workers (int, optional): Number of threads (or processes) used to read the file headers. Defaults to 1,
+            which reads every file sequentially.
+        processes (bool, optional): If True, the file headers are parsed in separate processes instead of threads,
+            which is faster when parsing, rather than the disk, is the bottleneck. Only available on platforms
+            supporting the `fork` start method; threads are used otherwise. Defaults to False.
         """
         # Reset measurements set:
         self.measurements = []
+        self.first_data_index = None
+        self.partitioned_measurements = None
+        self.segments = {}
 
         # Walk the folder tree:
-        for root, dirs, files in os.walk(self.folder):
-            for file in files:
-                path = os.path.join(root, file)
+        entries = list ( _iter_files ( self.folder ) )
                 
+        # Reading the file headers is mostly waiting on the disk, so it can be done
+        # in parallel if requested:
+        if workers > 1 and processes and 'fork' in multiprocessing.get_all_start_methods():
+            # Parse the files which are not cached yet in a pool of processes, and store the results in a
+            # cache. The measurement files are then built from the cache, in this process.
+            cache = self.cache if self.cache is not None else MeasurementCache()
+            
+            # The status of each file is only requested once from the operating system: the directory
+            # entries keep it, and it is reused when storing the results and building the measurement files.
+            stale_entries = []
+            for entry in entries:
                 try:
-                    file = MeasurementFile( path = path )
-                    
-                    # Only read the files that are between specified dates:
-                    good_file = False
-                    
-                    date = file.StartDateTime()
+                    if cache.get ( entry.path, entry.stat() ) is None:
+                        stale_entries.append ( entry )
+                except OSError:
+                    continue
                     
-                    if start_date == None:
-                        if end_date == None:
-                            good_file = True
-                        elif date <= end_date:
-                            good_file = True
-                    elif end_date == None:
-                        if date >= start_date:
-                            good_file = True
-                    elif date >= start_date and date <= end_date:
-                        good_file = True
+            # Forking avoids importing obiwan again in every worker process:
+            context = multiprocessing.get_context ( 'fork' )
+            unreadable_paths = set()
+            
+            with ProcessPoolExecutor ( max_workers = workers, mp_context = context ) as executor:
+                stale_paths = [ entry.path for entry in stale_entries ]
                 
-                    if good_file:
-                        self.measurements.append(file)
+                for entry, result in zip ( stale_entries, executor.map ( _read_measurement_info, stale_paths, chunksize = 32 ) ):
+                    if result is None:
+                        unreadable_paths.add ( entry.path )
+                    else:
+                        cache.set ( entry.path, entry.stat(), *result )
                         
-                except Exception as e:
-                    # This was most likely not a valid measurement file.
-                    #
-                    # Continue silently. Shhhh.
-                    continue
+            files = [ _read_measurement_file ( entry, cache ) for entry in entries if entry.path not in unreadable_paths ]
+        elif workers > 1:
+            with ThreadPoolExecutor ( max_workers = workers ) as executor:
+                files = list ( executor.map ( _read_measurement_file, entries, repeat ( self.cache ) ) )
+        else:
+            files = [ _read_measurement_file ( entry, self.cache ) for entry in entries ]
+            
+        if self.cache is not None:
+            self.cache.prune ( self.folder, [ entry.path for entry in entries ] )
+            self.cache.save()
+            
+        # Only read the files that are between specified dates. The dates are converted once to the
+        # whole seconds the file start times are stored in, rounding inwards so that a file starting
+        # exactly on a whole second is accepted if, and only if, it is between the dates:
+        first_second = -( ( TIME_ORIGIN - start_date ) // ONE_SECOND ) if start_date is not None else None
+        last_second = ( end_date - TIME_ORIGIN ) // ONE_SECOND if end_date is not None else None
+        
+        for file in files:
+            if file is None:
+                # This was most likely not a valid measurement file.
+                #
+                # Continue silently. Shhhh.
+                continue
+                
+            if first_second is not None and file.start_seconds < first_second:
+                continue
+                
+            if last_second is not None and file.start_seconds > last_second:
+                continue
+        
+            self.measurements.append(file)
                     
         # Make sure we get a unique list of files!
         # Since we're walking down the folder tree, it might just so happen
@@ -1246,7 +1739,36 @@ class Lidarchive:
         #
         # When that happens, atmospheric-lidar is confused and throws errors,
         # so it's better to take care of it here.
-        seen = set()
-        self.measurements = [ m for m in self.measurements if m.Filename() not in seen and not seen.add(m.Filename()) ]
-
-        self.measurements.sort(key=lambda x: x.StartDateTime())
+        measurements_by_name = {}
+        for measurement in self.measurements:
+            measurements_by_name.setdefault ( measurement.filename, measurement )
+            
+        self.measurements = list ( measurements_by_name.values() )
+        self.measurements.sort ( key = attrgetter ( 'start_seconds' ) )
+        
+    def ReadFolderParallel(
+        self,
+        start_date : Optional[datetime] = None,
+        end_date : Optional[datetime] = None,
+        workers : Optional[int] = None,
+        processes : bool = False
+    ) -> None:
+        """
+        Same as `ReadFolder`, but the file headers are read using a pool of threads, or processes if requested.
+        
+        Args:
+        start_date (:obj:`datetime`, optional): The earliest date a measurement could have been taken at.
+            If set to None, this criteria will not be used.
+        end_date (:obj:`datetime`, optional): The earliest date a measurement could have been taken at.
+            If set to None, this criteria will not be used.
+        workers (int, optional): Number of threads used to read the file headers. If set to None,
+            it will be computed based on the number of available CPUs.
+        processes (bool, optional): If True, the file headers are parsed in separate processes. See `ReadFolder`.
+        """
+        if workers is None:
+            if processes:
+                workers = os.cpu_count() or 1
+            else:
+                workers = min ( 32, ( os.cpu_count() or 1 ) * 4 )
+            
+        self.ReadFolder ( start_date = start_date, end_date = end_date, workers = workers, processes = processes )
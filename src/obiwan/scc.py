@@ -1,9 +1,15 @@
 from obiwan.log import logger
 
+from pathlib import PurePath
+
 import os
+import random
+import re
+import threading
+import time
 
-from scc_access import scc_access
-from netCDF4 import Dataset
+_ELPP_VERSION_REGEX = re.compile ( r'ELPP version: ([^;]*);' )
+_ELDA_VERSION_REGEX = re.compile ( r'ELDA version: (.*)$' )
 
 def SetSCCConfig ( basic_credentials, output_dir, scc_base_url, website_credentials = None ):
     global scc
@@ -11,23 +17,48 @@ def SetSCCConfig ( basic_credentials, output_dir, scc_base_url, website_credenti
 
 class OwScc:
     def __init__ ( self ):
-        self.client = None
+        self._client = None
         self.basic_credentials = None
         self.output_dir = None
         self.client_base_url = None
         self.website_credentials = None
         self.logged_in = False
+        self.upload_slots = threading.BoundedSemaphore ( 1 )
+        self.client_lock = threading.Lock()
     
-    def Initialize ( self, basic_credentials, output_dir, scc_base_url, website_credentials ):
+    def Initialize ( self, basic_credentials, output_dir, scc_base_url, website_credentials, maximum_concurrent_uploads = 1 ):
+        '''
+        Store the SCC connection settings. The connection itself is only made, and the user
+        logged in, the first time the `client` is needed.
+        '''
         self.basic_credentials = basic_credentials
         self.output_dir = os.path.normpath ( output_dir )
         self.client_base_url = scc_base_url
         self.website_credentials = website_credentials
         
-        self.client = scc_access.SCC(self.basic_credentials, self.output_dir, self.client_base_url)
+        # Limit the number of files being sent to the SCC at the same time:
+        self.upload_slots = threading.BoundedSemaphore ( maximum_concurrent_uploads )
+        
+    @property
+    def client ( self ):
+        '''
+        The `scc_access` client, logged in to the SCC website.
+        '''
+        with self.client_lock:
+            if self._client is None:
+                # Import the SCC client here to keep the application start-up fast (e.g. for --help):
+                from scc_access import scc_access
+                
+                client = scc_access.SCC(self.basic_credentials, self.output_dir, self.client_base_url)
+                self.Login ( client )
+                
+                # Only keep the client once logged in, so a failed login is tried again next time:
+                self._client = client
+                
+        return self._client
         
-    def Login ( self ):
-        self.client.login(self.website_credentials)
+    def Login ( self, client = None ):
+        ( client or self._client ).login(self.website_credentials)
         self.logged_in = True
     
     @staticmethod
@@ -44,11 +75,10 @@ class OwScc:
         -------------
         String representing the SCC preprocessor version.
         '''
-        dataset = Dataset ( file )
-        pp_version = dataset.SCCPreprocessingVersion
-        dataset.close ()
+        from netCDF4 import Dataset
         
-        return pp_version
+        with Dataset ( file ) as dataset:
+            return dataset.SCCPreprocessingVersion
     
     @staticmethod
     def GetELPP_ELDAVersion ( file ):
@@ -63,15 +93,15 @@ class OwScc:
         -------------
         Two strings, representing the ELPP version and the ELDA version.
         '''
-        dataset = Dataset ( file )
-        software_version = dataset.__AnalysisSoftwareVersion
-        dataset.close ()
+        from netCDF4 import Dataset
         
-        elpp_regex = 'ELPP version: ([^;]*);'
-        elda_regex = 'ELDA version: (.*)$'
+        # The attribute is read by name: written as `dataset.__AnalysisSoftwareVersion` inside
+        # this class, Python would mangle it into `_OwScc__AnalysisSoftwareVersion`.
+        with Dataset ( file ) as dataset:
+            software_version = dataset.getncattr ( '__AnalysisSoftwareVersion' )
         
-        scc_elpp_version = re.findall ( elpp_regex, software_version )[0]
-        scc_elda_version = re.findall ( elda_regex, software_version )[0]
+        scc_elpp_version = _ELPP_VERSION_REGEX.search ( software_version ).group ( 1 )
+        scc_elda_version = _ELDA_VERSION_REGEX.search ( software_version ).group ( 1 )
         
         return scc_elpp_version, scc_elda_version
 
@@ -91,6 +121,8 @@ class OwScc:
         -------------
         String representing the SCC version and SCC processor versions description.
         '''
+        from netCDF4 import Dataset
+        
         # Try to read SCC version information from HiRelPP. If that fails, fallback to ELPP.
         elpp_folder = os.path.join ( download_folder, measurement_id, 'elpp' )
         hirelpp_folder = os.path.join ( download_folder, measurement_id, 'hirelpp' )
@@ -101,13 +133,15 @@ class OwScc:
         
         for folder in folders_to_scan:
             try:
-                file = os.path.join ( folder, os.listdir ( folder )[0] )
+                # Only the first file of the folder is needed, so the folder is not listed entirely:
+                with os.scandir ( folder ) as entries:
+                    file = next ( entries ).path
                 
                 with Dataset( file ) as dataset:
                     scc_version = dataset.scc_version_description
                     
                 break
-            except:
+            except Exception:
                 # HiRelPP products might not exist. We can try checking ELPP files next.
                 continue
         
@@ -129,7 +163,7 @@ class OwScc:
             
         return upload
 
-    def UploadMeasurement ( self, filename, system_id, max_retry_count, replace ):
+    def UploadMeasurement ( self, filename, system_id, max_retry_count, replace, max_retry_delay = 30 ):
         '''
         Upload a NetCDF file to the SCC and process it.
         
@@ -142,22 +176,36 @@ class OwScc:
         scc : SCC
             SCC object used for interacting with the SCC API.
         max_retry_count : int
-            Maximum number of retries in case of a failed upload.
+            Maximum number of retries in case of a failed upload. Retries are delayed
+            with an exponential backoff (with jitter), capped at `max_retry_delay`.
+        replace : bool
+            Whether to replace the measurement if it already exists in the SCC.
+        max_retry_delay : float
+            Maximum delay, in seconds, between two upload attempts. Defaults to 30.
         '''
-        measurement_id = os.path.splitext ( os.path.basename(filename) ) [0]
-        
-        retry_count = 0
+        measurement_id = PurePath ( filename ).stem
         
-        # Send the file to SCC and start the processing chain:
-        upload = self.TryUpload (filename, system_id, replace)
+        upload = False
         
-        # If the upload failed, retry for a given number of times.
-        while upload == False and retry_count < max_retry_count:
-            retry_count += 1
-            logger.warning ( "Upload to SCC failed. Retrying (%d/%d)." % (retry_count, max_retry_count), extra={'scope': measurement_id} )
-            
-            upload = self.TryUpload (filename, system_id, replace)
-            
+        for attempt in range ( max_retry_count + 1 ):
+            if attempt > 0:
+                # If the upload failed, back off before retrying so we don't hammer the SCC:
+                delay = min ( 2 ** attempt + random.random(), max_retry_delay )
+                logger.warning ( "Upload to SCC failed. Retrying in %.1f seconds (%d/%d).", delay, attempt, max_retry_count, extra={'scope': measurement_id} )
+                time.sleep ( delay )
+                
+            # Send the file to SCC and start the processing chain. Connection errors and
+            # timeouts (including those raised by requests) are all OSError subclasses:
+            try:
+                with self.upload_slots:
+                    upload = self.TryUpload (filename, system_id, replace)
+            except OSError as e:
+                logger.warning ( "SCC upload error: %s", e, extra={'scope': measurement_id} )
+                upload = False
+                
+            if upload:
+                break
+                
         return upload
         
     def DownloadProducts ( self, measurements ):
@@ -185,7 +233,7 @@ class OwScc:
                 logger.debug ( "Processing finished", extra={'scope': measurement_id} )
                 
                 try:
-                    scc_version = GetSCCVersion ( self.client.output_dir, measurement_id )
+                    scc_version = OwScc.GetSCCVersion ( self.client.output_dir, measurement_id )
                 except Exception as e:
                     if result.elpp != 127:
                         logger.error ( "No SCC products found", extra={'scope': measurement_id} )
@@ -1,58 +1,66 @@
 #!/usr/bin/env python
 
-from setuptools import setup
+import functools
 import os
-import re
-import io
 
-# Read the long description from the readme file
-with open("readme.rst", "rb") as f:
-    long_description = f.read().decode("utf-8")
-
-
-# Read the version parameters from the __init__.py file. In this way
-# we keep the version information in a single place.
-def read(*names, **kwargs):
-    with io.open(
+# Read a file next to this script, whatever the current directory is.
+def read(*names):
+    with open(
             os.path.join(os.path.dirname(__file__), *names),
-            encoding=kwargs.get("encoding", "utf8")
+            encoding="utf-8"
     ) as fp:
         return fp.read()
 
 
+# Read the version parameters from the __init__.py file. In this way
+# we keep the version information in a single place. The version is only
+# looked up once, even if setup hooks ask for it again.
+@functools.lru_cache(maxsize=None)
 def find_version(*file_paths):
-    version_file = read(*file_paths)
-    version_match = re.search(r"^__version__ = ['\"]([^'\"]*)['\"]",
-                              version_file, re.M)
-    if version_match:
-        return version_match.group(1)
+    # Stop reading as soon as the version line is found, which is usually
+    # at the top of the file.
+    with open(
+            os.path.join(os.path.dirname(__file__), *file_paths),
+            encoding="utf-8"
+    ) as fp:
+        for line in fp:
+            if line.startswith("__version__"):
+                return line.split("=", 1)[1].strip().strip("'\"")
     raise RuntimeError("Unable to find version string.")
 
 
-# Run setup
-setup(name='obiwan',
-      packages=['obiwan'],
-      version=find_version("obiwan", "__init__.py"),
-      description='Package for automated lidar data processing using the Single Calculus Chain',
-      long_description=long_description,
-      url='',
-      author='Victor Nicolae',
-      author_email='victor.nicolae@inoe.ro',
-      license='MIT',
-      classifiers=[
-          'Development Status :: 3 - Alpha',
-          'License :: OSI Approved :: MIT License',
-          'Programming Language :: Python :: 2',
-          'Intended Audience :: Science/Research',
-          'Topic :: Scientific/Engineering :: Atmospheric Science',
-      ],
-      keywords='lidar licel',
-      install_requires=[
-        "atmospheric_lidar",
-        "scc_access==0.11.0" #,
-#        "pollyxt-pipelines>=1.12.0"
-      ],
-      entry_points={
-          'console_scripts': ['obiwan = obiwan.app:main',],
-      },
-      )
+# Setuptools and the long description are only needed when actually running setup,
+# not when this file is imported by tools looking for its helpers.
+if __name__ == "__main__":
+    from setuptools import setup
+
+    # Read the long description from the readme file
+    long_description = read("readme.rst")
+
+    # Run setup
+    setup(name='obiwan',
+          packages=['obiwan'],
+          version=find_version("obiwan", "__init__.py"),
+          description='Package for automated lidar data processing using the Single Calculus Chain',
+          long_description=long_description,
+          url='',
+          author='Victor Nicolae',
+          author_email='victor.nicolae@inoe.ro',
+          license='MIT',
+          classifiers=[
+              'Development Status :: 3 - Alpha',
+              'License :: OSI Approved :: MIT License',
+              'Programming Language :: Python :: 2',
+              'Intended Audience :: Science/Research',
+              'Topic :: Scientific/Engineering :: Atmospheric Science',
+          ],
+          keywords='lidar licel',
+          install_requires=[
+            "atmospheric_lidar",
+            "scc_access==0.11.0" #,
+    #        "pollyxt-pipelines>=1.12.0"
+          ],
+          entry_points={
+              'console_scripts': ['obiwan = obiwan.app:main',],
+          },
+          )
@@ -0,0 +1,81 @@
+import importlib.util
+import os
+import pickle
+
+import pytest
+
+LOG_MODULE_PATH = os.path.join ( os.path.dirname ( __file__ ), os.pardir, "src", "obiwan", "log.py" )
+
+@pytest.fixture
+def log_module ( tmp_path, monkeypatch ):
+    # Importing the `obiwan` package starts the application, so the module is loaded from its file.
+    # It also sets up an `obiwan.log` file in the current folder, which is kept out of the tree:
+    monkeypatch.chdir ( tmp_path )
+
+    spec = importlib.util.spec_from_file_location ( "obiwan_log", LOG_MODULE_PATH )
+    module = importlib.util.module_from_spec ( spec )
+    spec.loader.exec_module ( module )
+
+    return module
+
+@pytest.fixture
+def datalog ( log_module, tmp_path ):
+    datalog = log_module.Datalog ( file_path = tmp_path / "obiwan.swp" )
+    datalog.config = { "configuration_file": "obiwan.config.yaml" }
+    datalog.tasks = { "first": { "result": "converted" } }
+    datalog.save()
+
+    datalog.tasks[ "second" ] = { "result": "uploaded" }
+    datalog.unsaved_tasks.add ( "second" )
+    datalog.checkpoint()
+
+    return datalog
+
+def reload ( log_module, datalog ):
+    loaded = log_module.Datalog ( file_path = datalog.file_path )
+
+    return loaded, loaded.load()
+
+def test_journal_is_replayed ( log_module, datalog ):
+    loaded, result = reload ( log_module, datalog )
+
+    assert result
+    assert loaded.tasks == datalog.tasks
+
+def test_corrupt_journal_header_keeps_snapshot ( log_module, datalog ):
+    with open ( datalog.journal_path(), 'wb' ) as file:
+        file.write ( os.urandom ( 10 ) )
+
+    loaded, result = reload ( log_module, datalog )
+
+    assert result
+    assert loaded.config == datalog.config
+    assert loaded.tasks == { "first": { "result": "converted" } }
+
+def test_truncated_journal_record_keeps_previous_records ( log_module, datalog ):
+    datalog.tasks[ "third" ] = { "result": "downloaded" }
+    datalog.unsaved_tasks.add ( "third" )
+    datalog.checkpoint()
+
+    size = os.path.getsize ( datalog.journal_path() )
+    os.truncate ( datalog.journal_path(), size - 5 )
+
+    loaded, result = reload ( log_module, datalog )
+
+    assert result
+    assert loaded.tasks == { "first": { "result": "converted" }, "second": { "result": "uploaded" } }
+
+def test_checkpoint_after_damaged_journal_is_not_lost ( log_module, datalog ):
+    with open ( datalog.journal_path(), 'ab' ) as file:
+        file.write ( pickle.dumps ( ("task", "third", {}) )[:-3] )
+
+    loaded, _ = reload ( log_module, datalog )
+
+    loaded.tasks[ "fourth" ] = { "result": "converted" }
+    loaded.unsaved_tasks.add ( "fourth" )
+    loaded.checkpoint()
+
+    reloaded, result = reload ( log_module, datalog )
+
+    assert result
+    assert set ( reloaded.tasks ) == { "first", "second", "fourth" }